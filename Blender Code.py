@@ -1,28 +1,50 @@
 import bpy
 import math
-import xml.etree.ElementTree as ET
-
-# Neteja l'escena abans de començar
-if bpy.ops.object.select_all.poll():
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=True)
-
-def note_number(note, octave):
-    base_notes = {'A': 1, 'B': 3, 'C': -8, 'D': -6, 'E': -4, 'F': -3, 'G': -1}
-    note_val = base_notes.get(note, 0)
-    note_val += octave * 12
-    return note_val
-
-def get_harmonics(note_val, count=10):
-    harmonics = []
-    fundamental_freq = 440 * math.pow(2.0, (note_val - 49) / 12.0)
-    
-    for i in range(1, count + 1):
-        harmonic_freq = fundamental_freq * i
-        harmonic_note = int(round(12 * math.log2(harmonic_freq / 440) + 49))
-        harmonics.append(harmonic_note)
-        
-    return set(harmonics)
+import os
+import sys
+
+# Carpeta dels mòduls compartits (timebase.py, harmonics.py i blender_scene.py), que
+# han d'estar al costat del script. Si es deixa buida, es fa servir la carpeta del
+# fitxer del text obert a l'editor de text de Blender (o la del script, amb
+# 'blender --python'). Es pot escriure com input_file, o relativa al .blend amb '//'.
+modules_dir = ""
+
+def find_modules_dir():
+    """Troba la carpeta dels mòduls compartits.
+
+    A l'editor de text, __file__ és '<fitxer .blend>/<nom del text>' (o '/<nom del
+    text>' si no s'ha desat), així que no serveix: cal el camí del fitxer del text.
+    """
+    if modules_dir:
+        return bpy.path.abspath(modules_dir)
+
+    text = bpy.data.texts.get(os.path.basename(__file__))
+    if text is not None:
+        if text.filepath:
+            return os.path.dirname(bpy.path.abspath(text.filepath))
+        if bpy.data.filepath:
+            # Text intern del .blend: els mòduls han d'estar al costat del .blend
+            return os.path.dirname(bpy.data.filepath)
+        raise ImportError("No es troben els mòduls compartits: desa el script al costat de "
+                          "timebase.py, harmonics.py i blender_scene.py o omple modules_dir")
+
+    # Executat amb 'blender --python script.py'
+    return os.path.dirname(os.path.abspath(__file__))
+
+# Afegeix la carpeta dels mòduls al path per poder importar-los
+script_dir = find_modules_dir()
+if script_dir not in sys.path:
+    sys.path.append(script_dir)
+
+from timebase import load_events
+from harmonics import note_number, get_harmonics
+from blender_scene import create_voice_curve, tag_object, note_key, quarter_fraction, sync_points, sync_curves
+
+def clear_scene():
+    # Neteja l'escena abans de començar
+    if bpy.ops.object.select_all.poll():
+        bpy.ops.object.select_all(action='SELECT')
+        bpy.ops.object.delete(use_global=True)
 
 def get_or_create_voice_material(voice):
     mat_name = f"Color_Voice_{voice}"
@@ -52,6 +74,7 @@ def create_point(location, voice, name="Point"):
     bpy.ops.mesh.primitive_cube_add(size=0.2, location=location)
     cube = bpy.context.active_object
     cube.name = name
+    tag_object(cube, name, 'point', voice)
     
     mat = get_or_create_voice_material(voice)
     
@@ -62,132 +85,70 @@ def create_point(location, voice, name="Point"):
     
     return cube
 
-def create_bezier_curves(voice_data):
+def create_bezier_curves(voice_data, preview=False):
     for voice_num, points in voice_data.items():
         if len(points) < 2:
             continue
-            
-        curve_data = bpy.data.curves.new(f'VoiceCurveData_{voice_num}', type='CURVE')
-        curve_data.dimensions = '3D'
-        curve_data.fill_mode = 'FULL'
-        curve_data.bevel_depth = 0.05
-        
-        spline = curve_data.splines.new('BEZIER')
-        spline.bezier_points.add(len(points) - 1)
-        
-        for i, point_coord in enumerate(points):
-            bp = spline.bezier_points[i]
-            bp.co = point_coord
-            bp.handle_left_type = 'AUTO'
-            bp.handle_right_type = 'AUTO'
-        
-        curve_obj = bpy.data.objects.new(f'Voice_{voice_num}_Curve', curve_data)
         
         mat = get_or_create_voice_material(voice_num)
-        curve_obj.data.materials.append(mat)
-        
-        bpy.context.collection.objects.link(curve_obj)
+        create_voice_curve(voice_num, points, mat, preview)
 
 
-def read_xml_and_translate(input_file):
+def read_xml_and_translate(input_file, preview=False, sync=False):
     print(f"Processant fitxer: {input_file}")
     
     try:
-        tree = ET.parse(input_file)
-        root = tree.getroot()
+        # Totes les posicions són ticks enters (veure timebase.py)
+        events = load_events(input_file)
         
         # Paràmetres per al cercle
         radius = 5.0
         
         scale_z = 0.2
-        x_offset, divisions = 0.0, 1.0
-        time_signature = {'beats': 4, 'beat-type': 4}
 
         color_to_voice = {'#0000FF': 1, '#00AA00': 2, '#FF0000': 3, '#AA00FF': 4}
         
+        # Els fitxers sense colors (per exemple els MIDI) fan servir el número de veu
+        use_colors = any(events['color'])
+        
         voice_points = {1: [], 2: [], 3: [], 4: [], 5: []}
         
         notes_at_time = {}
         
+        # Punts a crear, amb una clau estable per nota: clau -> (location, voice)
+        scene_points = {}
         
-        total_duration = 0.0
-        for part in root.findall('part'):
-            for measure in part.findall('measure'):
-                for element in measure:
-                    if element.tag == 'note':
-                        duration_elem = element.find('duration')
-                        if duration_elem is not None: total_duration += float(duration_elem.text)
-                    elif element.tag == 'backup':
-                        duration_elem = element.find('duration')
-                        if duration_elem is not None: total_duration -= float(duration_elem.text)
+        total_duration = events['end_tick']
 
         # Recorregut per crear els punts en forma de cercle
-        x_offset = 0.0
-        for part in root.findall('part'):
-            for measure in part.findall('measure'):
-                measure_num = measure.get('number')
-                
-                measure_time_cursor = 0.0
-                
-                for element in measure:
-                    if element.tag == 'attributes':
-                        div_elem = element.find('divisions')
-                        if div_elem is not None: divisions = float(div_elem.text)
-                        
-                        time_elem = element.find('time')
-                        if time_elem is not None:
-                            beats = time_elem.find('beats')
-                            beat_type = time_elem.find('beat-type')
-                            if beats is not None and beat_type is not None:
-                                time_signature = {'beats': int(beats.text), 'beat-type': int(beat_type.text)}
-
-                    elif element.tag == 'note':
-                        color_hex, voice_num = None, None
-                        if 'color' in element.attrib: color_hex = element.get('color')
-                        else:
-                            notehead = element.find('notehead')
-                            if notehead is not None and 'color' in notehead.attrib:
-                                color_hex = notehead.get('color')
-                        
-                        if color_hex: voice_num = color_to_voice.get(color_hex.upper())
-                        
-                        if element.find('rest') is None and voice_num is not None:
-                            pitch = element.find('pitch')
-                            if pitch is not None:
-                                step = pitch.find('step').text
-                                octave = int(pitch.find('octave').text)
-                                alter_elem = pitch.find('alter')
-                                
-                                note_val = note_number(step, octave)
-                                if alter_elem is not None: note_val += int(alter_elem.text)
-                                
-                                current_time = round((x_offset + measure_time_cursor), 2)
-                                if current_time not in notes_at_time:
-                                    notes_at_time[current_time] = {}
-                                notes_at_time[current_time][voice_num] = note_val
-                                
-                                # Càlcul de coordenades circulars
-                                angle = (current_time / total_duration) * 2 * math.pi
-                                
-                                # Coordenades amb radi constant
-                                x_location = radius * math.cos(angle)
-                                y_location = radius * math.sin(angle)
-                                z_location = note_val * scale_z
-                                
-                                location = (x_location, y_location, z_location)
-                                
-                                voice_points[voice_num].append(location)
-                                create_point(location, voice_num, f"M{measure_num}_V{voice_num}")
-
-                        duration_elem = element.find('duration')
-                        if duration_elem is not None: measure_time_cursor += float(duration_elem.text)
-                    
-                    elif element.tag == 'backup':
-                        duration_elem = element.find('duration')
-                        if duration_elem is not None: measure_time_cursor -= float(duration_elem.text)
+        for i in range(len(events['onset'])):
+            if use_colors:
+                voice_num = color_to_voice.get(events['color'][i])
+            else:
+                voice_num = int(events['voice'][i]) if events['voice'][i] <= 4 else None
+            if events['rest'][i] or voice_num is None:
+                continue
+            
+            note_val = note_number(events['step'][i], int(events['octave'][i])) + int(events['alter'][i])
+            
+            current_time = int(events['onset'][i])
+            if current_time not in notes_at_time:
+                notes_at_time[current_time] = {}
+            notes_at_time[current_time][voice_num] = note_val
+            
+            # Càlcul de coordenades circulars
+            angle = (current_time / total_duration) * 2 * math.pi
             
-                measure_duration = (time_signature['beats'] * (4.0 / time_signature['beat-type'])) * divisions
-                x_offset += measure_duration
+            # Coordenades amb radi constant
+            x_location = radius * math.cos(angle)
+            y_location = radius * math.sin(angle)
+            z_location = note_val * scale_z
+            
+            location = (x_location, y_location, z_location)
+            
+            voice_points[voice_num].append(location)
+            key = note_key(scene_points, events, i, voice_num)
+            scene_points[key] = (location, voice_num)
         
         # Càlcul de la cinquena veu (harmònics conjunts)
         for time_point, voices in notes_at_time.items():
@@ -208,13 +169,28 @@ def read_xml_and_translate(input_file):
             location_5 = (x_location, y_location, z_location)
             
             voice_points[5].append(location_5)
-            create_point(location_5, 5, f"SharedHarmonics_T{time_point}")
-        
-        create_bezier_curves(voice_points)
+            scene_points[f"SharedHarmonics_Q{quarter_fraction(time_point, events['ticks_per_quarter'])}"] = (location_5, 5)
+        
+        if sync:
+            # Només s'afegeixen, es mouen o s'esborren els objectes que han canviat
+            added, moved, removed = sync_points(scene_points, get_or_create_voice_material)
+            print(f"Punts: {added} nous, {moved} moguts, {removed} esborrats")
+            added, moved, removed = sync_curves(voice_points, get_or_create_voice_material, preview)
+            print(f"Corbes: {added} noves, {moved} actualitzades, {removed} esborrades")
+        else:
+            for key, (location, voice_num) in scene_points.items():
+                create_point(location, voice_num, key)
+            create_bezier_curves(voice_points, preview)
 
     except Exception as e:
         print(f"S'ha produït un error inesperat: {str(e)}")
 
 
+# Amb preview = True les corbes es simplifiquen per a una escena més lleugera
+preview = False
+# Amb sync = True no s'esborra l'escena: només s'actualitza el que ha canviat
+sync = False
 input_file = "C:\\Users\\EricdelRíoSanz\\Desktop\\TdR\\Fuga_16_colors.musicxml"
-read_xml_and_translate(input_file)
\ No newline at end of file
+if not sync:
+    clear_scene()
+read_xml_and_translate(input_file, preview, sync)
\ No newline at end of file
@@ -0,0 +1,290 @@
+from fractions import Fraction
+import bpy
+import numpy as np
+
+# Paràmetres de les corbes: normal i previsualització (menys geometria al viewport)
+curve_settings = {
+    False: {'tolerance': 0.0, 'bevel_resolution': 4, 'resolution_u': 12},
+    True: {'tolerance': 0.1, 'bevel_resolution': 1, 'resolution_u': 3},
+}
+
+# Valor enter de 'AUTO' a l'enum dels tipus de nansa (HD_AUTO de Blender)
+auto_handle_type = 1
+
+def simplify_path(points, tolerance):
+    """Simplifica un camí 3D amb Ramer-Douglas-Peucker i retorna els índexs que es queden.
+
+    Cap punt eliminat queda a més de 'tolerance' del camí simplificat. El primer i
+    l'últim punt sempre es conserven.
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        # Distància de cada punt intermedi al segment first-last
+        inner = points[first + 1:last]
+        start, segment = points[first], points[last] - points[first]
+        length2 = segment @ segment
+        if length2 > 0:
+            t = np.clip((inner - start) @ segment / length2, 0.0, 1.0)
+            distances = np.linalg.norm(inner - (start + t[:, None] * segment), axis=1)
+        else:
+            distances = np.linalg.norm(inner - start, axis=1)
+
+        farthest = np.argmax(distances)
+        if distances[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return np.flatnonzero(keep)
+
+def auto_handles(points):
+    """Calcula les nanses 'AUTO' de Blender per a tots els punts alhora."""
+    points = np.asarray(points, dtype=float)
+
+    # Als extrems es fa servir el punt reflectit com a veí que falta
+    prev = np.vstack((2 * points[0] - points[1], points[:-1]))
+    following = np.vstack((points[1:], 2 * points[-1] - points[-2]))
+
+    vec_a, vec_b = points - prev, following - points
+    len_a = np.linalg.norm(vec_a, axis=1, keepdims=True)
+    len_b = np.linalg.norm(vec_b, axis=1, keepdims=True)
+    len_a[len_a == 0] = 1.0
+    len_b[len_b == 0] = 1.0
+
+    # Mateixa construcció que calchandleNurb de Blender
+    tangent = vec_a / len_a + vec_b / len_b
+    length = np.linalg.norm(tangent, axis=1, keepdims=True) * 2.5614
+    length[length == 0] = 1.0
+    handle_left = points - tangent * (len_a / length)
+    handle_right = points + tangent * (len_b / length)
+    return handle_left, handle_right
+
+def voice_curve_points(points, preview=False):
+    """Retorna els punts de control de la corba d'una veu, simplificats si cal."""
+    points = np.asarray(points, dtype=float)
+    return points[simplify_path(points, curve_settings[preview]['tolerance'])]
+
+def create_voice_curve(voice_num, points, material, preview=False):
+    """Crea la corba de Bézier d'una veu assignant totes les coordenades de cop.
+
+    Amb preview=True el camí es simplifica i es baixa la resolució del bisell, per
+    a escenes de previsualització més lleugeres.
+    """
+    settings = curve_settings[preview]
+    points = voice_curve_points(points, preview)
+
+    curve_data = bpy.data.curves.new(f'VoiceCurveData_{voice_num}', type='CURVE')
+    curve_data.dimensions = '3D'
+    curve_data.fill_mode = 'FULL'
+    curve_data.bevel_depth = 0.05
+    curve_data.bevel_resolution = settings['bevel_resolution']
+    curve_data.resolution_u = settings['resolution_u']
+
+    spline = curve_data.splines.new('BEZIER')
+    fill_spline(spline, points)
+
+    curve_obj = bpy.data.objects.new(f'Voice_{voice_num}_Curve', curve_data)
+    curve_obj.data.materials.append(material)
+    tag_object(curve_obj, f'Voice_{voice_num}_Curve', 'curve', voice_num)
+
+    bpy.context.collection.objects.link(curve_obj)
+    return curve_obj
+
+def fill_spline(spline, points):
+    """Assigna els punts i les nanses d'un spline amb foreach_set en lloc d'un bucle."""
+    bezier_points = spline.bezier_points
+    if len(bezier_points) < len(points):
+        bezier_points.add(len(points) - len(bezier_points))
+
+    handle_left, handle_right = auto_handles(points)
+    bezier_points.foreach_set('co', points.ravel())
+    bezier_points.foreach_set('handle_left', handle_left.ravel())
+    bezier_points.foreach_set('handle_right', handle_right.ravel())
+
+    # Els punts afegits amb add() són 'ALIGNED', no 'AUTO': es posen tots a 'AUTO'
+    # (com feia el bucle original) perquè les nanses se segueixin recalculant si
+    # s'edita la corba. Si foreach_set no accepta el valor enter de l'enum, es fa
+    # punt per punt.
+    auto_types = np.full(len(points), auto_handle_type, dtype=np.int32)
+    try:
+        bezier_points.foreach_set('handle_left_type', auto_types)
+        bezier_points.foreach_set('handle_right_type', auto_types)
+    except (TypeError, RuntimeError):
+        for point in bezier_points:
+            point.handle_left_type = 'AUTO'
+            point.handle_right_type = 'AUTO'
+
+    # foreach_set no marca la corba perquè es torni a avaluar
+    spline.id_data.update_tag()
+
+# Propietats que identifiquen els objectes creats pels scripts, perquè la
+# sincronització no toqui mai cap altre objecte de l'escena
+key_property = 'tdr_key'
+kind_property = 'tdr_kind'
+voice_property = 'tdr_voice'
+
+def unique_key(keys, base):
+    """Retorna 'base', o 'base_2', 'base_3'... si ja existeix (per exemple en acords)."""
+    key, n = base, 1
+    while key in keys:
+        n += 1
+        key = f'{base}_{n}'
+    return key
+
+def quarter_fraction(ticks, ticks_per_quarter):
+    """Escriu una durada en ticks com a fracció reduïda de negra ('3/2').
+
+    No depèn de la resolució: afegir un treset o un compàs de 3/8 a la partitura
+    canvia els ticks per negra, però no aquesta fracció.
+    """
+    fraction = Fraction(int(ticks), int(ticks_per_quarter))
+    return f'{fraction.numerator}/{fraction.denominator}'
+
+def note_key(keys, events, i, voice_num):
+    """Clau estable d'una nota: compàs, veu i posició dins del compàs en negres."""
+    offset = quarter_fraction(events['onset'][i] - events['measure_start'][i],
+                              events['ticks_per_quarter'])
+    return unique_key(keys, f"M{events['measure_number'][i]}_V{voice_num}_Q{offset}")
+
+def tag_object(obj, key, kind, voice):
+    """Marca un objecte amb la seva identitat estable ('point' o 'curve')."""
+    obj[key_property] = key
+    obj[kind_property] = kind
+    obj[voice_property] = voice
+
+def scene_objects(kind):
+    """Objectes de l'escena marcats amb tag_object, indexats per la seva clau."""
+    return {obj[key_property]: obj for obj in bpy.data.objects
+            if obj.get(kind_property) == kind}
+
+def diff_points(existing, desired, tolerance=1e-4):
+    """Compara dos diccionaris clau -> (location, voice).
+
+    Retorna les claus a afegir, les que cal moure o canviar de veu i les que cal
+    esborrar. No depèn de bpy, de manera que es pot provar fora de Blender. La
+    tolerància per defecte absorbeix la precisió float32 de les posicions de Blender.
+    """
+    to_add = [key for key in desired if key not in existing]
+    to_remove = [key for key in existing if key not in desired]
+    common = [key for key in desired if key in existing]
+
+    if not common:
+        return to_add, [], to_remove
+
+    # Totes les posicions es comparen de cop
+    old = np.array([existing[key][0] for key in common], dtype=float).reshape(-1, 3)
+    new = np.array([desired[key][0] for key in common], dtype=float).reshape(-1, 3)
+    moved = np.any(np.abs(old - new) > tolerance, axis=1)
+    to_update = [key for key, m in zip(common, moved)
+                 if m or existing[key][1] != desired[key][1]]
+    return to_add, to_update, to_remove
+
+def get_point_mesh(voice, material):
+    """Malla de cub compartida per tots els punts d'una veu."""
+    mesh_name = f'PointMesh_Voice_{voice}'
+    mesh = bpy.data.meshes.get(mesh_name)
+    if mesh is None:
+        # Cub de mida 0.2, com primitive_cube_add(size=0.2)
+        h = 0.1
+        verts = [(x, y, z) for x in (-h, h) for y in (-h, h) for z in (-h, h)]
+        faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1),
+                 (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+        mesh = bpy.data.meshes.new(mesh_name)
+        mesh.from_pydata(verts, [], faces)
+        mesh.update()
+        mesh.materials.append(material)
+    return mesh
+
+def sync_points(desired, get_material):
+    """Sincronitza els cubs de l'escena amb el diccionari clau -> (location, voice).
+
+    Només s'afegeixen, es mouen o s'esborren els punts que han canviat. Retorna el
+    nombre de punts afegits, actualitzats i esborrats.
+    """
+    objects = scene_objects('point')
+    existing = {key: (tuple(obj.location), obj.get(voice_property))
+                for key, obj in objects.items()}
+    to_add, to_update, to_remove = diff_points(existing, desired)
+
+    for key in to_remove:
+        bpy.data.objects.remove(objects[key], do_unlink=True)
+
+    for key in to_update:
+        location, voice = desired[key]
+        obj = objects[key]
+        obj.location = location
+        if obj.get(voice_property) != voice:
+            obj.data = get_point_mesh(voice, get_material(voice))
+            obj[voice_property] = voice
+
+    for key in to_add:
+        location, voice = desired[key]
+        obj = bpy.data.objects.new(key, get_point_mesh(voice, get_material(voice)))
+        obj.location = location
+        tag_object(obj, key, 'point', voice)
+        bpy.context.collection.objects.link(obj)
+
+    return len(to_add), len(to_update), len(to_remove)
+
+def sync_curves(voice_data, get_material, preview=False):
+    """Sincronitza les corbes de les veus amb els punts nous.
+
+    Si una corba té el mateix nombre de punts només se'n reescriuen les coordenades,
+    i només si han canviat; si no, es refà el spline. Retorna el nombre de corbes
+    creades, actualitzades i esborrades.
+    """
+    objects = scene_objects('curve')
+    settings = curve_settings[preview]
+    created, updated, wanted = 0, 0, set()
+
+    for voice_num, points in voice_data.items():
+        if len(points) < 2:
+            continue
+
+        key = f'Voice_{voice_num}_Curve'
+        wanted.add(key)
+        if key not in objects:
+            create_voice_curve(voice_num, points, get_material(voice_num), preview)
+            created += 1
+            continue
+
+        points = voice_curve_points(points, preview)
+        curve_data = objects[key].data
+        changed = (curve_data.bevel_resolution != settings['bevel_resolution']
+                   or curve_data.resolution_u != settings['resolution_u'])
+        curve_data.bevel_resolution = settings['bevel_resolution']
+        curve_data.resolution_u = settings['resolution_u']
+
+        spline = curve_data.splines[0] if len(curve_data.splines) else None
+        if spline is not None and len(spline.bezier_points) == len(points):
+            current = np.empty(len(points) * 3)
+            spline.bezier_points.foreach_get('co', current)
+            if np.allclose(current.reshape(-1, 3), points, atol=1e-4):
+                updated += changed
+                continue
+        else:
+            # Els punts d'un spline de Bézier no es poden esborrar un a un
+            curve_data.splines.clear()
+            spline = curve_data.splines.new('BEZIER')
+
+        fill_spline(spline, points)
+        updated += 1
+
+    removed = [key for key in objects if key not in wanted]
+    for key in removed:
+        bpy.data.objects.remove(objects[key], do_unlink=True)
+
+    return created, updated, len(removed)
@@ -0,0 +1,194 @@
+import os
+import sys
+import numpy as np
+from scipy import sparse
+from timebase import load_events
+from tonal_graph import load_tonal_functions, load_edges_dictionary, \
+  find_corpus_pieces
+
+################################################################
+# Similarity between the tonal-transition graphs of a corpus
+#
+# Every piece is described by its edges dictionary. The edges of
+# all the pieces are aligned on a shared node vocabulary, so that
+# edge "node1|node2" is column i * N + j of a sparse piece x edge
+# matrix (i and j being the indices of the two nodes). The
+# piece x piece similarity matrix is then computed in chunks of
+# rows, so that memory only depends on the chunk size.
+################################################################
+
+################################################################
+# Function to load the edges dictionary of one piece
+################################################################
+def load_piece_edges(score_file_name, csv_file_name):
+  events = load_events(score_file_name)
+  tonal_functions = load_tonal_functions(csv_file_name)
+  return load_edges_dictionary(events, tonal_functions)
+
+################################################################
+# Function to load the edges dictionaries of a list of pieces
+################################################################
+def load_corpus_edges(pieces):
+
+  # A piece that cannot be read is left out (and its error kept),
+  # so that it does not stop the rest of the corpus
+  loaded, edges_dictionaries, errors = [], [], {}
+  for score_file_name, csv_file_name in pieces:
+    try:
+      edges_dictionary = load_piece_edges(score_file_name, csv_file_name)
+    except Exception as e:
+      errors[score_file_name] = f"{type(e).__name__}: {e}"
+      continue
+    loaded.append((score_file_name, csv_file_name))
+    edges_dictionaries.append(edges_dictionary)
+  return loaded, edges_dictionaries, errors
+
+################################################################
+# Function to build the shared node vocabulary
+################################################################
+def build_node_vocabulary(edges_dictionaries):
+  nodes = set()
+  for edges_dictionary in edges_dictionaries:
+    for edge in edges_dictionary:
+      nodes.update(edge.split('|'))
+  return sorted(nodes)
+
+################################################################
+# Function to build the sparse piece x edge matrix
+################################################################
+def build_edge_matrix(edges_dictionaries, nodes):
+  node_index = {node: i for i, node in enumerate(nodes)}
+  node_count = len(nodes)
+
+  rows, columns, weights = [], [], []
+  for piece, edges_dictionary in enumerate(edges_dictionaries):
+    for edge, weight in edges_dictionary.items():
+      source, target = edge.split('|')
+      rows.append(piece)
+      columns.append(node_index[source] * node_count + node_index[target])
+      weights.append(weight)
+
+  return sparse.csr_matrix((weights, (rows, columns)),
+    shape=(len(edges_dictionaries), node_count * node_count),
+    dtype=np.float64)
+
+################################################################
+# Function to scale every row of a sparse matrix
+################################################################
+def normalize_rows(matrix, norm):
+  if norm == 'l2':
+    totals = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+  else:
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+  totals[totals == 0] = 1.0
+  return sparse.diags(1.0 / totals) @ matrix
+
+################################################################
+# Function to compute the cosine similarity matrix
+################################################################
+def cosine_similarity(matrix, chunk_size=1024, out=None):
+  piece_count = matrix.shape[0]
+  if out is None:
+    out = np.zeros((piece_count, piece_count))
+
+  # With unit rows, cosine similarity is a plain product
+  unit = normalize_rows(matrix, 'l2').tocsr()
+  unit_t = unit.T.tocsc()
+  for start in range(0, piece_count, chunk_size):
+    stop = min(start + chunk_size, piece_count)
+    out[start:stop] = (unit[start:stop] @ unit_t).toarray()
+  return out
+
+################################################################
+# Function to compute the Jensen-Shannon similarity matrix
+################################################################
+def jensen_shannon_similarity(matrix, chunk_size=256, max_pairs=2 ** 22,
+    out=None):
+  piece_count = matrix.shape[0]
+  if out is None:
+    out = np.zeros((piece_count, piece_count))
+
+  # Every piece becomes a distribution over the edges
+  distributions = normalize_rows(matrix, 'l1').tocsc()
+  distributions.sort_indices()
+
+  # With base-2 logarithms the divergence is between 0 and 1, and
+  # the similarity 1 - JS(p, q) is 1/2 * the sum over the edges of
+  # both pieces of g(p, q) = p log2((p + q) / p) + q log2((p + q) / q),
+  # so only the edges that both pieces share need to be visited
+  for start in range(0, piece_count, chunk_size):
+    stop = min(start + chunk_size, piece_count)
+    chunk = distributions[start:stop].tocsc()
+    chunk.sort_indices()
+    shared = np.zeros((stop - start, piece_count))
+
+    # Entries per column, for the chunk and for the whole corpus
+    chunk_counts = np.diff(chunk.indptr)
+    all_counts = np.diff(distributions.indptr)
+    pair_counts = chunk_counts * all_counts
+    columns = np.flatnonzero(pair_counts)
+
+    # Visit the columns in batches of about max_pairs pairs
+    cumulative = np.cumsum(pair_counts[columns])
+    splits = np.flatnonzero(np.diff((cumulative - 1) // max_pairs)) + 1
+    for batch in np.split(columns, splits):
+      if len(batch) == 0:
+        continue
+
+      # Every (chunk entry, corpus entry) pair of every column
+      counts = pair_counts[batch]
+      total = counts.sum()
+      column_of_pair = np.repeat(np.arange(len(batch)), counts)
+      offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts,
+        counts)
+      width = all_counts[batch][column_of_pair]
+      a = chunk.indptr[batch][column_of_pair] + offset // width
+      b = distributions.indptr[batch][column_of_pair] + offset % width
+
+      p = chunk.data[a]
+      q = distributions.data[b]
+      g = p * np.log2((p + q) / p) + q * np.log2((p + q) / q)
+      shared += np.bincount(
+        chunk.indices[a] * piece_count + distributions.indices[b],
+        weights=g, minlength=shared.size).reshape(shared.shape)
+
+    out[start:stop] = 0.5 * shared
+
+  return out
+
+################################################################
+# Function to compute a similarity matrix for a whole corpus
+################################################################
+def corpus_similarity(edges_dictionaries, metric='cosine', out=None,
+    **options):
+  nodes = build_node_vocabulary(edges_dictionaries)
+  matrix = build_edge_matrix(edges_dictionaries, nodes)
+  if metric == 'cosine':
+    return cosine_similarity(matrix, out=out, **options)
+  if metric == 'jensen-shannon':
+    return jensen_shannon_similarity(matrix, out=out, **options)
+  raise ValueError(f"Unknown metric: {metric}")
+
+################################################################
+# Main program - Similarity matrix of every piece in a folder
+################################################################
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else '.'
+  metric = sys.argv[2] if len(sys.argv) > 2 else 'cosine'
+
+  pieces, edges_dictionaries, errors = load_corpus_edges(
+    find_corpus_pieces(folder))
+  print(f"Piece count: {len(pieces)}")
+  for score_file_name, error in errors.items():
+    print(f"Error in {os.path.basename(score_file_name)}: {error}")
+
+  # The matrix is written straight to disk, so that it does not
+  # have to fit in memory for very large corpora
+  out = np.lib.format.open_memmap(f'similarity_{metric}.npy', mode='w+',
+    shape=(len(pieces), len(pieces)))
+  corpus_similarity(edges_dictionaries, metric, out=out)
+  out.flush()
+
+  with open(f'similarity_{metric}_pieces.txt', 'w') as names_file:
+    for score_file_name, csv_file_name in pieces:
+      names_file.write(os.path.basename(score_file_name) + '\n')
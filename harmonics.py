@@ -0,0 +1,137 @@
+import math
+import numpy as np
+
+# Valor de cada nota a l'octava 0 (la tecla 49 és el La 440)
+base_notes = {'A': 1, 'B': 3, 'C': -8, 'D': -6, 'E': -4, 'F': -3, 'G': -1}
+
+def note_number(note, octave):
+    note_val = base_notes.get(note, 0)
+    note_val += octave * 12
+    return note_val
+
+def get_harmonics(note_val, count=10):
+    # Genera una llista dels 10 primers harmònics
+    harmonics = []
+    fundamental_freq = 440 * math.pow(2.0, (note_val - 49) / 12.0)
+
+    for i in range(1, count + 1):
+        harmonic_freq = fundamental_freq * i
+        harmonic_note = int(round(12 * math.log2(harmonic_freq / 440) + 49))
+        harmonics.append(harmonic_note)
+
+    return set(harmonics)
+
+def note_values(events):
+    """Calcula el número de nota de tots els esdeveniments de la taula (veure timebase.py)."""
+    base = np.array([base_notes.get(step, 0) for step in events['step']], dtype=np.int64)
+    return base + events['octave'] * 12 + events['alter']
+
+def harmonic_numbers(note_vals, count=10):
+    """Versió vectoritzada de get_harmonics: afegeix un últim eix amb els 'count' harmònics."""
+    # L'harmònic k està a 12*log2(k) semitons de la fonamental, sigui quina sigui la nota
+    offsets = np.rint(12 * np.log2(np.arange(1, count + 1))).astype(np.int64)
+    return np.asarray(note_vals, dtype=np.int64)[..., None] + offsets
+
+def sounding_slices(events, voices=None):
+    """Retorna, per a cada instant on comença alguna nota, la nota que sona a cada veu.
+
+    El resultat és (times, voice_ids, note_grid, sounding): note_grid i sounding tenen
+    forma temps × veu, i sounding indica si la veu té una nota sonant en aquell instant.
+    Es pot passar un array 'voices' per agrupar les notes d'una altra manera (per
+    exemple pel color, com fan els scripts de Blender); les notes amb veu 0 s'ignoren.
+    """
+    if voices is None:
+        voices = events['voice']
+    notes = np.flatnonzero(~events['rest'] & (voices != 0))
+    onsets = events['onset'][notes]
+    ends = onsets + events['duration'][notes]
+    note_vals = note_values(events)[notes]
+    voices = voices[notes]
+
+    times = np.unique(onsets)
+    voice_ids = np.unique(voices)
+    note_grid = np.zeros((len(times), len(voice_ids)), dtype=np.int64)
+    sounding = np.zeros((len(times), len(voice_ids)), dtype=bool)
+
+    for v, voice in enumerate(voice_ids):
+        in_voice = np.flatnonzero(voices == voice)
+        in_voice = in_voice[np.argsort(onsets[in_voice], kind='stable')]
+
+        # Última nota de la veu que comença abans o just a cada instant
+        last = np.searchsorted(onsets[in_voice], times, side='right') - 1
+        has_note = last >= 0
+        last = in_voice[np.maximum(last, 0)]
+        sounding[:, v] = has_note & (times < ends[last])
+        note_grid[:, v] = np.where(sounding[:, v], note_vals[last], 0)
+
+    return times, voice_ids, note_grid, sounding
+
+def shared_partials_matrix(note_grid, sounding, count=10, weighted=False, chunk_size=4096):
+    """Calcula, per a cada instant, la matriu veu × veu d'harmònics compartits.
+
+    Es construeix el tensor temps × veu × harmònic i es comparen tots els parells de
+    veus amb broadcasting, per blocs de 'chunk_size' instants per limitar la memòria.
+    Amb weighted=True també es retorna una consonància entre 0 i 1: els harmònics
+    compartits es ponderen amb l'amplitud 1/k de cada harmònic (1 vol dir uníson).
+    """
+    n_times, n_voices = note_grid.shape
+    shared = np.zeros((n_times, n_voices, n_voices), dtype=np.int64)
+    consonance = np.zeros((n_times, n_voices, n_voices)) if weighted else None
+
+    amplitudes = 1.0 / np.arange(1, count + 1)
+    norm = np.sum(amplitudes ** 2)
+
+    for start in range(0, n_times, chunk_size):
+        block = slice(start, start + chunk_size)
+        partials = harmonic_numbers(note_grid[block], count)
+        both = sounding[block][:, :, None] & sounding[block][:, None, :]
+
+        # equal[t, v, w, p, q]: l'harmònic p de la veu v és l'harmònic q de la veu w
+        equal = partials[:, :, None, :, None] == partials[:, None, :, None, :]
+        shared[block] = np.where(both, equal.any(axis=-1).sum(axis=-1), 0)
+
+        if weighted:
+            score = np.einsum('tvwpq,p,q->tvw', equal, amplitudes, amplitudes) / norm
+            consonance[block] = np.where(both, score, 0.0)
+
+    if weighted:
+        return shared, consonance
+    return shared
+
+def common_partials_count(note_grid, sounding, count=10):
+    """Nombre d'harmònics comuns a TOTES les veus que sonen a cada instant.
+
+    Amb les franges de sounding_slices també compten les notes que es mantenen d'abans,
+    de manera que no és la 5a veu dels scripts de Blender, que només creua les veus que
+    comencen una nota en aquell instant: per exemple, un Do4 blanca contra Do3 i Sol3
+    negres dona 2 harmònics comuns a la segona negra, i els scripts hi posen 0.
+    """
+    partials = harmonic_numbers(note_grid, count)
+    in_other = (partials[:, :, None, :, None] == partials[:, None, :, None, :]).any(axis=-1)
+
+    # Les veus que no sonen no limiten la intersecció
+    in_other |= ~sounding[:, None, :, None]
+    common = in_other.all(axis=2) & sounding[:, :, None]
+    counts = common.sum(axis=-1).max(axis=-1, initial=0)
+    return np.where(sounding.sum(axis=1) >= 2, counts, 0)
+
+def analyse_consonance(events, voices=None, count=10, weighted=True):
+    """Anàlisi completa d'una peça: retorna un diccionari d'arrays preparat per dibuixar."""
+    times, voice_ids, note_grid, sounding = sounding_slices(events, voices)
+    result = {
+        'times': times,
+        'voices': voice_ids,
+        'notes': note_grid,
+        'sounding': sounding,
+        'common': common_partials_count(note_grid, sounding, count),
+    }
+    if weighted:
+        result['shared'], result['consonance'] = shared_partials_matrix(
+            note_grid, sounding, count, weighted=True)
+    else:
+        result['shared'] = shared_partials_matrix(note_grid, sounding, count)
+    return result
+
+def save_consonance(file_name, result):
+    """Guarda el resultat d'analyse_consonance en un fitxer .npz."""
+    np.savez_compressed(file_name, **result)
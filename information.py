@@ -0,0 +1,116 @@
+import sys
+import numpy as np
+from timebase import load_events
+from tonal_graph import load_tonal_functions, load_nodes_dictionary, \
+  load_edges_dictionary, load_graph_arrays
+
+################################################################
+# Information-theoretic metrics of the tonal-function graph
+#
+# The keys of the edges are "later|earlier" (find_measure_edges
+# links every note with the notes before it), so the edge weights
+# are read as a joint distribution of (current node, next node)
+# with the current node in the target column. Notes that start at
+# the same time in different voices are linked both ways, and the
+# weights cannot tell them apart afterwards, so they also count as
+# successors. The node counts are read as a joint distribution of
+# (pitch step, tonal function). Everything is computed from the
+# arrays of load_graph_arrays, with the shares of every edge
+# already normalised, in base 2.
+################################################################
+
+################################################################
+# Function to calculate p * log2(p), with 0 * log2(0) = 0
+################################################################
+def plogp(p):
+  p = np.asarray(p, dtype=np.float64)
+  return p * np.log2(np.where(p > 0, p, 1.0))
+
+################################################################
+# Function to calculate the entropy of the transitions of every
+# node
+################################################################
+def transition_entropies(graph_arrays):
+
+  # H(next | current = node), over the edges that end in the node
+  # (the notes that follow it); a node without successors has
+  # entropy 0. Adding 0.0 turns -0.0 into 0.0.
+  entropies = -np.bincount(graph_arrays['target'],
+    weights=plogp(graph_arrays['successor_shares']),
+    minlength=len(graph_arrays['nodes']))
+  return entropies.astype(np.float64) + 0.0
+
+################################################################
+# Function to calculate the conditional entropy of the chain
+################################################################
+def conditional_entropy(graph_arrays, entropies=None):
+
+  # H(next | current) = sum over the nodes of p(node) * H(node),
+  # where p(node) is its share of the total weight of the edges
+  # towards its successors
+  total = graph_arrays['weights'].sum()
+  if total == 0:
+    return 0.0
+  if entropies is None:
+    entropies = transition_entropies(graph_arrays)
+  return float(graph_arrays['successor_sums'] / total @ entropies)
+
+################################################################
+# Function to calculate the mutual information between tonal
+# function and pitch step
+################################################################
+def function_step_information(graph_arrays):
+
+  # Nodes are "step-tonal_function"
+  names = [node.split('-', 1) for node in graph_arrays['nodes']]
+  _, steps = np.unique([step for step, _ in names] + [''],
+    return_inverse=True)
+  _, functions = np.unique([function for _, function in names] + [''],
+    return_inverse=True)
+  steps, functions = steps.ravel()[:-1], functions.ravel()[:-1]
+
+  counts = graph_arrays['node_counts']
+  total = counts.sum()
+  if total == 0:
+    return 0.0
+
+  # I(F; S) = H(S) + H(F) - H(S, F)
+  joint = np.zeros((steps.max(initial=0) + 1, functions.max(initial=0) + 1))
+  np.add.at(joint, (steps, functions), counts / total)
+  return float(plogp(joint).sum() - plogp(joint.sum(axis=1)).sum()
+    - plogp(joint.sum(axis=0)).sum())
+
+################################################################
+# Function to calculate all the metrics of a graph
+################################################################
+def information_metrics(nodes_dictionary, edges_dictionary,
+    graph_arrays=None):
+  if graph_arrays is None:
+    graph_arrays = load_graph_arrays(nodes_dictionary, edges_dictionary)
+
+  entropies = transition_entropies(graph_arrays)
+  return {
+    'transition_entropies': dict(zip(graph_arrays['nodes'],
+      entropies.tolist())),
+    'conditional_entropy': conditional_entropy(graph_arrays, entropies),
+    'function_step_information': function_step_information(graph_arrays),
+  }
+
+################################################################
+# Main program - Metrics of one score
+################################################################
+if __name__ == '__main__':
+  score_file_name, csv_file_name = sys.argv[1], sys.argv[2]
+
+  events = load_events(score_file_name)
+  tonal_functions = load_tonal_functions(csv_file_name)
+  nodes_dictionary = load_nodes_dictionary(events, tonal_functions)
+  edges_dictionary = load_edges_dictionary(events, tonal_functions)
+  metrics = information_metrics(nodes_dictionary, edges_dictionary)
+
+  for node, entropy in sorted(metrics['transition_entropies'].items(),
+      key=lambda item: -item[1]):
+    print(f"{node}: {entropy:.3f} bits")
+  print(f"Conditional entropy: {metrics['conditional_entropy']:.3f} bits")
+  print("Mutual information (function, step): "
+    f"{metrics['function_step_information']:.3f} bits")
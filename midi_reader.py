@@ -0,0 +1,210 @@
+import math
+import numpy as np
+from timebase import build_events
+
+################################################################
+# Standard MIDI File reader
+#
+# Decodes the note-on/note-off events of a .mid file straight
+# into the note-event table of timebase.py, so that the analysis
+# and the Blender scripts can use MIDI files as well as MusicXML.
+# Voices are the tracks (or the channels) that contain notes,
+# measures come from the time-signature events and every pitch is
+# spelled to a step, using flats in keys with flats.
+################################################################
+
+# Spelling of the 12 pitch classes as (step, alter)
+sharp_spelling = [('C', 0), ('C', 1), ('D', 0), ('D', 1), ('E', 0),
+  ('F', 0), ('F', 1), ('G', 0), ('G', 1), ('A', 0), ('A', 1), ('B', 0)]
+flat_spelling = [('C', 0), ('D', -1), ('D', 0), ('E', -1), ('E', 0),
+  ('F', 0), ('G', -1), ('G', 0), ('A', -1), ('A', 0), ('B', -1), ('B', 0)]
+
+# Number of data bytes of every channel message type
+data_lengths = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1,
+  0xE0: 2}
+
+################################################################
+# Function to read a variable-length quantity
+################################################################
+def read_variable_length(data, pos):
+  value = 0
+  while True:
+    byte = data[pos]
+    pos += 1
+    value = (value << 7) | (byte & 0x7F)
+    if byte < 0x80:
+      return value, pos
+
+################################################################
+# Function to read the notes and meta events of one track
+################################################################
+def read_track(data, pos, end, track_no, notes, meta):
+
+  # Notes still sounding, by (channel, pitch), oldest first
+  open_notes = {}
+  tick = 0
+
+  # Running status only ever repeats the last channel message: meta
+  # and sysex events do not replace it
+  running_status = 0
+
+  while pos < end:
+
+    # Most delta times fit in a single byte
+    delta = data[pos]
+    if delta < 0x80:
+      pos += 1
+    else:
+      delta, pos = read_variable_length(data, pos)
+    tick += delta
+
+    status = data[pos]
+    if status >= 0x80:
+      pos += 1
+      if status < 0xF0:
+        running_status = status
+    else:
+      status = running_status
+
+    if status == 0xFF:
+      meta_type = data[pos]
+      length, pos = read_variable_length(data, pos + 1)
+      meta.append((tick, meta_type, data[pos:pos + length]))
+      pos += length
+      if meta_type == 0x2F:
+        break
+
+    elif status in (0xF0, 0xF7):
+      length, pos = read_variable_length(data, pos)
+      pos += length
+
+    else:
+      kind = status & 0xF0
+      if kind == 0x90 or kind == 0x80:
+        key = (status & 0x0F, data[pos])
+        if kind == 0x90 and data[pos + 1] > 0:
+          if key in open_notes:
+            open_notes[key].append(tick)
+          else:
+            open_notes[key] = [tick]
+        else:
+          started = open_notes.get(key)
+          if started:
+            notes.append((track_no, key[0], key[1], started.pop(0), tick))
+        pos += 2
+      else:
+        pos += data_lengths[kind]
+
+  # Notes without a note-off end with the track
+  for (channel, pitch), started in open_notes.items():
+    for onset in started:
+      notes.append((track_no, channel, pitch, onset, tick))
+
+  return tick
+
+################################################################
+# Function to find where every measure starts
+################################################################
+def find_measure_starts(time_signatures, ticks_per_quarter, end_tick):
+
+  # Time signatures are assumed to change at the start of a measure
+  changes = sorted(time_signatures)
+  starts = []
+  tick, beats, beat_type = 0, 4, 4
+  i = 0
+  while tick < end_tick or not starts:
+    while i < len(changes) and changes[i][0] <= tick:
+      beats, beat_type = changes[i][1], changes[i][2]
+      i += 1
+    starts.append(tick)
+    tick += beats * 4 * ticks_per_quarter // beat_type
+
+  return np.array(starts, dtype=np.int64), tick
+
+################################################################
+# Function to load the note-event table from a MIDI file
+################################################################
+def load_midi_events(midi_file_name, voices_by='auto'):
+  with open(midi_file_name, 'rb') as midi_file:
+    data = midi_file.read()
+
+  if data[:4] != b'MThd':
+    raise ValueError(f"Not a Standard MIDI File: {midi_file_name}")
+  header_length = int.from_bytes(data[4:8], 'big')
+  division = int.from_bytes(data[12:14], 'big')
+  if division & 0x8000:
+    raise ValueError("SMPTE time division is not supported")
+
+  # Read every track chunk
+  notes, meta = [], []
+  pos, track_no, end_tick = 8 + header_length, 0, 0
+  while pos + 8 <= len(data):
+    chunk_type = data[pos:pos + 4]
+    length = int.from_bytes(data[pos + 4:pos + 8], 'big')
+    pos += 8
+    if chunk_type == b'MTrk':
+      end_tick = max(end_tick, read_track(data, pos, pos + length,
+        track_no, notes, meta))
+      track_no += 1
+    pos += length
+
+  time_signatures = [(tick, payload[0], 2 ** payload[1])
+    for tick, meta_type, payload in meta if meta_type == 0x58]
+  key_signatures = sorted((tick, int.from_bytes(payload[:1], 'big',
+    signed=True)) for tick, meta_type, payload in meta
+    if meta_type == 0x59)
+
+  # Same tick resolution rule as the MusicXML path: eighth notes
+  # and measures must last a whole number of ticks
+  ticks_per_quarter = math.lcm(division, 2,
+    *[max(1, beat_type // 4) for _, _, beat_type in time_signatures])
+  scale = ticks_per_quarter // division
+  time_signatures = [(tick * scale, beats, beat_type)
+    for tick, beats, beat_type in time_signatures]
+
+  # Notes without any duration are dropped
+  notes = np.array(notes, dtype=np.int64).reshape(-1, 5)
+  notes = notes[notes[:, 4] > notes[:, 3]]
+  track, channel, pitch = notes[:, 0], notes[:, 1], notes[:, 2]
+  onset, offset = notes[:, 3] * scale, notes[:, 4] * scale
+  measure_starts, end_tick = find_measure_starts(time_signatures,
+    ticks_per_quarter, max(end_tick * scale, 1))
+  measure = np.searchsorted(measure_starts, onset, side='right') - 1
+
+  # Voices are numbered from 1, in order of track (or channel).
+  # With 'auto', a file with all its notes in one track (format 0)
+  # is split by channel.
+  if voices_by == 'auto':
+    voices_by = 'track' if len(np.unique(track)) > 1 else 'channel'
+  source = track if voices_by == 'track' else channel
+  _, voice = np.unique(source, return_inverse=True)
+  voice = voice.ravel() + 1
+
+  # Spell every pitch with the key signature at its onset
+  key_ticks = np.array([tick * scale for tick, _ in key_signatures],
+    dtype=np.int64)
+  key_flats = np.array([sf < 0 for _, sf in key_signatures] or [False])
+  uses_flats = key_flats[np.maximum(
+    np.searchsorted(key_ticks, onset, side='right') - 1, 0)]
+  spelling = np.where(uses_flats[:, None],
+    np.array(flat_spelling, dtype=object)[pitch % 12],
+    np.array(sharp_spelling, dtype=object)[pitch % 12])
+
+  # Rows in the same order as a MusicXML score: measure by measure,
+  # and voice by voice inside every measure
+  order = np.lexsort((pitch, onset, voice, measure))
+  rows = {}
+  rows['part'] = np.zeros(len(order), dtype=np.int64)
+  rows['measure'] = measure[order]
+  rows['measure_number'] = (measure[order] + 1).astype(str)
+  rows['measure_start'] = measure_starts[measure[order]]
+  rows['voice'] = voice[order]
+  rows['onset'] = onset[order]
+  rows['duration'] = (offset - onset)[order]
+  rows['step'] = spelling[order, 0]
+  rows['octave'] = pitch[order] // 12 - 1
+  rows['alter'] = spelling[order, 1].astype(np.int64)
+  rows['rest'] = np.zeros(len(order), dtype=bool)
+  rows['color'] = [''] * len(order)
+
+  return build_events(rows, ticks_per_quarter, end_tick)
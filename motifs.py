@@ -0,0 +1,279 @@
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from timebase import load_events
+from harmonics import note_values
+
+################################################################
+# Motif finder (subject, answer and their fragments)
+#
+# Every voice becomes a melodic line (the highest note of every
+# onset) and then a sequence of intervals, optionally paired with
+# the ratio between consecutive durations, so that a motif matches
+# at any transposition. The voices are joined into one sequence,
+# with a unique separator between them, and every window of
+# min_length notes gets a rolling hash, all at once. The hash
+# groups are verified against the actual intervals and then grown
+# one interval at a time, to report every maximal repeat: a
+# pattern whose occurrences cannot all be extended with the same
+# interval to the left or to the right.
+################################################################
+
+# Odd multiplier of the rolling hash, so that it can be inverted
+# modulo 2^64 (uint64 arithmetic wraps around)
+hash_base = np.uint64(0x9E3779B97F4A7C15)
+
+################################################################
+# Function to build the melodic line of every voice
+################################################################
+def find_voice_lines(events):
+  lines = []
+  notes = np.flatnonzero(~events['rest'])
+  pitches = note_values(events)
+  for voice in np.unique(events['voice'][notes]):
+    voice_notes = notes[events['voice'][notes] == voice]
+
+    # Highest note of every onset (chords keep their top note)
+    order = np.lexsort((-pitches[voice_notes],
+      events['onset'][voice_notes]))
+    voice_notes = voice_notes[order]
+    first = np.ones(len(voice_notes), dtype=bool)
+    first[1:] = np.diff(events['onset'][voice_notes]) > 0
+    lines.append((int(voice), voice_notes[first]))
+  return lines
+
+################################################################
+# Function to convert the lines into one token sequence
+################################################################
+def build_interval_tokens(events, lines, rhythm=False):
+  pitches = note_values(events)
+  durations = events['duration']
+
+  # Every token describes the step between two consecutive notes
+  columns = []
+  for voice, line in lines:
+    step = [np.diff(pitches[line])]
+    if rhythm:
+      ratio_gcd = np.gcd(durations[line][1:], durations[line][:-1])
+      ratio_gcd[ratio_gcd == 0] = 1
+      step += [durations[line][1:] // ratio_gcd,
+        durations[line][:-1] // ratio_gcd]
+    columns.append(np.stack(step, axis=1))
+
+  steps = np.concatenate(columns + [np.empty((0, 2 * rhythm + 1),
+    np.int64)])
+  _, tokens = np.unique(steps, axis=0, return_inverse=True)
+  tokens = tokens.ravel().astype(np.int64)
+  token_count = int(tokens.max(initial=-1)) + 1
+
+  # Voices are joined with a different separator after each one, so
+  # that no repeated window can cross from one voice to another.
+  # Every token also keeps its first note, its voice and its
+  # interval.
+  parts = {'token': [], 'note': [], 'voice': [], 'interval': []}
+  start = 0
+  for i, (voice, line) in enumerate(lines):
+    count = max(len(line) - 1, 0)
+    parts['token'] += [tokens[start:start + count], [token_count + i]]
+    parts['note'] += [line[:count], [-1]]
+    parts['voice'] += [np.full(count, voice), [voice]]
+    parts['interval'] += [steps[start:start + count, 0], [0]]
+    start += count
+
+  return {name: np.concatenate([np.asarray(part, dtype=np.int64)
+    for part in part_list] + [np.empty(0, np.int64)])
+    for name, part_list in parts.items()}
+
+################################################################
+# Function to hash every window of a sequence at once
+################################################################
+def rolling_hashes(sequence, length):
+
+  # With P[n] = sum(x[k] * B^-k, k < n), the hash of x[i:i+length]
+  # is (P[i + length] - P[i]) * B^i, all modulo 2^64
+  count = len(sequence)
+  inverse_base = pow(int(hash_base), -1, 2 ** 64)
+  powers = np.cumprod(np.full(count, hash_base, dtype=np.uint64))
+  powers = np.concatenate(([np.uint64(1)], powers[:-1]))
+  inverse_powers = np.cumprod(np.full(count, np.uint64(inverse_base)))
+  inverse_powers = np.concatenate(([np.uint64(1)], inverse_powers[:-1]))
+
+  values = (sequence.astype(np.uint64) + np.uint64(1)) * inverse_powers
+  prefix = np.concatenate(([np.uint64(0)], np.cumsum(values,
+    dtype=np.uint64)))
+  window_count = count - length + 1
+  return (prefix[length:] - prefix[:window_count]) * powers[:window_count]
+
+################################################################
+# Function to group the equal windows of a sequence
+################################################################
+def group_windows(sequence, length):
+  hashes = rolling_hashes(sequence, length)
+  _, group, counts = np.unique(hashes, return_inverse=True,
+    return_counts=True)
+  group = group.ravel()
+
+  # Verify every repeated window against the first window of its
+  # hash group; the rare collisions are regrouped exactly
+  repeated = np.flatnonzero(counts[group] > 1)
+  windows = sliding_window_view(sequence, length)
+  first = np.full(len(counts), -1)
+  first[group[repeated[::-1]]] = repeated[::-1]
+  same = np.all(windows[repeated] == windows[first[group[repeated]]],
+    axis=1)
+  colliding = repeated[~same]
+  if len(colliding):
+    _, exact = np.unique(windows[colliding], axis=0, return_inverse=True)
+    group[colliding] = len(counts) + exact.ravel()
+  return group
+
+################################################################
+# Function to find the maximal repeats of a token sequence
+################################################################
+def find_maximal_repeats(sequence, min_length):
+  repeats = []
+  if len(sequence) < min_length or min_length < 1:
+    return repeats
+
+  # Tokens before and after every window (-1 out of the sequence)
+  padded = np.concatenate(([-1], sequence, [-1]))
+  length = min_length
+  starts = np.arange(len(sequence) - length + 1)
+  group = group_windows(sequence, length)
+
+  while len(starts):
+
+    # Keep the windows that appear at least twice
+    _, group, counts = np.unique(group, return_inverse=True,
+      return_counts=True)
+    group = group.ravel()
+    repeated = counts[group] > 1
+    starts, group = starts[repeated], group[repeated]
+    if not len(starts):
+      break
+    order = np.lexsort((starts, group))
+    starts, group = starts[order], group[order]
+    bounds = np.flatnonzero(np.diff(group)) + 1
+    first = np.concatenate(([0], bounds))
+    last = np.concatenate((bounds, [len(group)])) - 1
+
+    # A group is maximal if its occurrences do not all share the
+    # token before them, nor the token after them
+    before = padded[starts]
+    after = padded[starts + length + 1]
+    left = (np.minimum.reduceat(before, first)
+      == np.maximum.reduceat(before, first)) & (before[first] >= 0)
+    right = (np.minimum.reduceat(after, first)
+      == np.maximum.reduceat(after, first)) & (after[first] >= 0)
+    for i in np.flatnonzero(~left & ~right):
+      repeats.append((length, starts[first[i]:last[i] + 1]))
+
+    # Grow every window by one token: two windows stay equal if they
+    # were equal and the new token is the same too
+    grows = starts + length < len(sequence)
+    starts, group = starts[grows], group[grows]
+    next_token = sequence[starts + length]
+    group = group * (int(sequence.max()) + 1) + next_token
+    length += 1
+
+  return repeats
+
+################################################################
+# Function to find the repeated motifs of a note-event table
+################################################################
+def find_motifs(events, min_length=5, rhythm=False):
+
+  # min_length is counted in notes, the patterns in intervals
+  lines = find_voice_lines(events)
+  tokens = build_interval_tokens(events, lines, rhythm)
+  pitches = note_values(events)
+
+  motifs = []
+  for length, starts in find_maximal_repeats(tokens['token'],
+      min_length - 1):
+    notes = tokens['note'][starts]
+    motifs.append({
+      'length': length + 1,
+      'intervals': tokens['interval'][starts[0]:starts[0] + length],
+      'voices': tokens['voice'][starts],
+      'measures': events['measure_number'][notes],
+      'onsets': events['onset'][notes],
+      'transpositions': pitches[notes] - pitches[notes[0]],
+    })
+
+  # Longest motifs first, then the most frequent ones
+  motifs.sort(key=lambda motif: (-motif['length'], -len(motif['voices'])))
+  return motifs
+
+################################################################
+# Function to find the motifs of one score (in a worker)
+################################################################
+def find_score_motifs(score):
+  score_file_name, min_length, rhythm = score
+
+  # A score that cannot be read is returned as an error, so that it
+  # does not stop the rest of the corpus
+  try:
+    events = load_events(score_file_name)
+    return find_motifs(events, min_length, rhythm), None
+  except Exception as e:
+    return [], f"{type(e).__name__}: {e}"
+
+################################################################
+# Function to find the motifs of every score of a folder
+################################################################
+def find_corpus_motifs(folder, min_length=5, rhythm=False, workers=None):
+  score_file_names = sorted(glob.glob(os.path.join(folder, '*.musicxml'))
+    + glob.glob(os.path.join(folder, '*.mid')))
+  scores = [(score_file_name, min_length, rhythm)
+    for score_file_name in score_file_names]
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    results = list(executor.map(find_score_motifs, scores))
+
+  # Motifs of every score, and the error of every score that failed
+  corpus_motifs = {score_file_name: motifs
+    for score_file_name, (motifs, error) in zip(score_file_names, results)}
+  errors = {score_file_name: error
+    for score_file_name, (motifs, error) in zip(score_file_names, results)
+    if error is not None}
+  return corpus_motifs, errors
+
+################################################################
+# Function to write the motifs as a CSV file, one row per occurrence
+################################################################
+def write_motifs(file_name, corpus_motifs):
+  with open(file_name, mode='w', newline='') as csv_file:
+    csv_writer = csv.writer(csv_file)
+    csv_writer.writerow(['piece', 'motif', 'length', 'intervals', 'voice',
+      'measure', 'onset', 'transposition'])
+    for score_file_name, motifs in corpus_motifs.items():
+      piece = os.path.basename(score_file_name)
+      for motif_no, motif in enumerate(motifs, 1):
+        intervals = ' '.join(str(i) for i in motif['intervals'])
+        for occurrence in zip(motif['voices'], motif['measures'],
+            motif['onsets'], motif['transpositions']):
+          csv_writer.writerow([piece, motif_no, motif['length'],
+            intervals, *occurrence])
+
+################################################################
+# Main program - Motifs of every score in a folder
+################################################################
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else '.'
+  min_length = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+  rhythm = len(sys.argv) > 3 and sys.argv[3] == 'rhythm'
+
+  start = time.perf_counter()
+  corpus_motifs, errors = find_corpus_motifs(folder, min_length, rhythm)
+  write_motifs('motifs.csv', corpus_motifs)
+  print(f"Score count: {len(corpus_motifs)}")
+  print(f"Motif count: {sum(len(m) for m in corpus_motifs.values())}")
+  print(f"Total time: {time.perf_counter() - start:.2f} s")
+  for score_file_name, error in errors.items():
+    print(f"Error in {os.path.basename(score_file_name)}: {error}")
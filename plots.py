@@ -0,0 +1,182 @@
+import math
+import numpy as np
+from mpl_toolkits.mplot3d import Axes3D
+
+################################################################
+# Figures of the tonal-function graph
+#
+# The drawing functions take the matplotlib figure (and axes) to
+# draw on, so that the same figures can be shown interactively by
+# the analysis script or rendered to files by report.py.
+################################################################
+
+################################################################
+# Function to draw the circular graph of nodes and edges
+################################################################
+def draw_network_graph(fig, ax, nodes_dictionary, edges_dictionary):
+
+  # Calculate the nodes position in a circle
+  positions = {}
+  nodes = list(nodes_dictionary.keys())
+  center_x, center_y, radius = 0, 0, 1.5
+  angle_per_node = 2 * math.pi / len(nodes)
+
+  for i, node in enumerate(nodes):
+    angle = i * angle_per_node
+    x = center_x + radius * math.cos(angle)
+    y = center_y + radius * math.sin(angle)
+    positions[node] = (x, y)
+
+  # Draw the edges (the connecting lines)
+  for edge, weight in edges_dictionary.items():
+    try:
+      source, target = edge.split('|')
+      if source in positions and target in positions:
+        source_x, source_y = positions[source]
+        target_x, target_y = positions[target]
+
+        # Set the line width based on the weight
+        width = max(0.5, math.log(weight) / 2)
+
+        # Margin to avoid arrows overlapping with nodes
+        margin = 15
+
+        # Draw the arrow from source to target
+        ax.annotate("",
+          xy=(target_x, target_y), 
+          xytext=(source_x, source_y),
+          arrowprops=dict(
+            arrowstyle="->", 
+            color="gray", 
+            linewidth=width,
+            shrinkA=margin,
+            shrinkB=margin,
+            patchA=None,
+            patchB=None,
+            connectionstyle="arc3,rad=0.1",
+          ))
+    except ValueError:
+      print(f"Error while processing edge: {edge}")
+
+  # Draw arrows for edges with significant weights in red
+  for edge, weight in edges_dictionary.items():
+    try:
+      source, target = edge.split('|')
+      if source in positions and target in positions:
+        source_x, source_y = positions[source]
+        target_x, target_y = positions[target]
+
+        # Filter for significant weights
+        if math.log(weight) / 2 >= 2:
+
+          # Set the line width based on the weight
+          width = max(0.5, math.log(weight) / 2)
+
+          # Margin to avoid arrows overlapping with nodes
+          margin = 15
+
+          # Dibuixem una fletxa de l'origen al destí
+          ax.annotate("",
+            xy=(target_x, target_y), 
+            xytext=(source_x, source_y),
+            arrowprops=dict(
+              arrowstyle="->", 
+              linewidth=width,
+              color="red", 
+              shrinkA=margin,
+              shrinkB=margin,
+              patchA=None,
+              patchB=None,
+              connectionstyle="arc3,rad=0.1",
+            ))
+    except ValueError:
+      print(f"Error while processing edge: {edge}")
+
+  # Draw the nodes and their labels
+  for node, pos in positions.items():
+    x, y = pos
+
+    # Determine the size of the node based on its frequency
+    size = nodes_dictionary.get(node, 1) * 35
+  
+    # Draw the node as a scatter point
+    # Using z-order = 5 to ensure nodes are on top of edges
+    ax.scatter(x, y, s=size, color='skyblue', zorder=5)
+  
+    # Draw the node label
+    ax.text(x, y, node, ha='center', va='center',
+      fontsize=9, zorder=10)
+
+  # Final adjustments
+  ax.set_title("Graf de les relacions entre Funcions Tonals",
+      fontsize=16)
+  ax.set_aspect('equal', adjustable='box') # Ensure circle shape
+  ax.axis('off') # Hide axis
+  fig.tight_layout()
+
+################################################################
+# Function to draw the 3D plot of the edge entropies
+################################################################
+def draw_entropy_plot(fig, nodes_dictionary, entropies_dictionary):
+
+  # Create a numeric map for EACH unique node
+  all_nodes = list(nodes_dictionary.keys())
+  node_map = {node: i for i, node in enumerate(all_nodes)}
+
+  x_data = [] # Source node
+  y_data = [] # Target node
+  z_data = [] # Entropy value
+
+  nodes_x = []
+  nodes_y = []
+
+  for edge, entropy in entropies_dictionary.items():
+    if entropy > 5:
+      source, desti = edge.split('|')
+
+      # Check that both source and target are in our map
+      if source in node_map and desti in node_map:
+        # X axis -> Number of the source node
+        x_data.append(node_map[source])
+        nodes_x.append(source)
+
+        # Y axis -> Number of the target node
+        y_data.append(node_map[desti])
+        nodes_y.append(desti)
+
+        # Z axis -> Entropy value
+        z_data.append(entropy)
+
+  # Convert to numpy arrays for matplotlib
+  x = np.array(x_data)
+  y = np.array(y_data)
+  z = np.array(z_data)
+
+  # Create 3D axes
+  ax = fig.add_subplot(111, projection='3d')
+
+  surf = ax.plot_trisurf(x, y, z, cmap='viridis', shade=True,
+    antialiased=True)
+
+  ax.set_xlabel('Node Origen', labelpad=35)
+  ax.set_ylabel('Node Destí', labelpad=35)
+  ax.set_zlabel('Entropia Calculada (%)')
+
+  # Set labels for axis X and Y to show ONLY the real nodes
+  ax.set_xticks(list(node_map.values()))
+  x_labels = ax.set_xticklabels([f"{node}------------" 
+    if i % 2 == 0 else node for i, node in enumerate(
+      node_map.keys())], rotation=45, ha='right', fontsize=7)
+
+  ax.set_yticks(list(node_map.values()))
+  y_labels = ax.set_yticklabels([f"------------{node}"
+    if i % 2 == 0 else node for i, node in enumerate(
+      node_map.keys())], rotation=-15, ha='left', fontsize=7)
+
+  fig.colorbar(surf, ax=ax, shrink=0.6, aspect=10,
+    label='Entropia (%)')
+
+  # Adjust the layout so that labels do not overlap
+  fig.tight_layout()
+
+  return node_map
@@ -0,0 +1,177 @@
+import csv
+import html
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from timebase import load_events
+from tonal_graph import load_tonal_functions, load_nodes_dictionary, \
+  load_edges_dictionary, calculate_entropies, find_corpus_pieces
+from plots import draw_network_graph, draw_entropy_plot
+
+################################################################
+# Batch report of a whole corpus
+#
+# Renders the network graph, the entropy plot and the summary
+# tables of every piece of a folder to files, with the
+# non-interactive Agg backend. Pieces are rendered in a process
+# pool; every figure is a standalone Figure object (no pyplot
+# state), so workers never share a figure context. An index.html
+# links everything, and render_times.csv records how long every
+# figure took.
+################################################################
+
+# Figures of every piece: file name, size and drawing function
+report_figures = [
+  ('network_graph', (14, 14), lambda fig, nodes, edges, entropies:
+    draw_network_graph(fig, fig.add_subplot(), nodes, edges)),
+  ('entropy_plot', (12, 8), lambda fig, nodes, edges, entropies:
+    draw_entropy_plot(fig, nodes, entropies)),
+]
+
+################################################################
+# Function to write a summary table as a CSV file
+################################################################
+def write_table(file_name, header, rows):
+  with open(file_name, mode='w', newline='') as csv_file:
+    csv_writer = csv.writer(csv_file)
+    csv_writer.writerow(header)
+    csv_writer.writerows(rows)
+
+################################################################
+# Function to render the report of one piece (in a worker)
+################################################################
+def render_piece_report(piece):
+  score_file_name, csv_file_name, output_folder, dpi = piece
+  name = os.path.splitext(os.path.basename(score_file_name))[0]
+  piece_folder = os.path.join(output_folder, name)
+  os.makedirs(piece_folder, exist_ok=True)
+  report = {'piece': name, 'files': {}, 'render_times': {},
+    'errors': {}, 'node_count': None, 'edge_count': None}
+
+  # Analysis of the piece. A piece that cannot be read (for example
+  # a truncated file) is recorded as an error, so that the rest of
+  # the corpus is still reported.
+  start = time.perf_counter()
+  try:
+    events = load_events(score_file_name)
+    tonal_functions = load_tonal_functions(csv_file_name)
+    nodes_dictionary = load_nodes_dictionary(events, tonal_functions)
+    edges_dictionary = load_edges_dictionary(events, tonal_functions)
+    entropies_dictionary = calculate_entropies(nodes_dictionary,
+      edges_dictionary)
+  except Exception as e:
+    report['errors']['analysis'] = f"{type(e).__name__}: {e}"
+    return report
+  finally:
+    report['render_times']['analysis'] = time.perf_counter() - start
+  report['node_count'] = len(nodes_dictionary)
+  report['edge_count'] = len(edges_dictionary)
+
+  # Summary tables
+  tables = {
+    'nodes': (['node', 'count'], nodes_dictionary.items()),
+    'edges': (['source', 'target', 'weight'],
+      [edge.split('|') + [weight]
+        for edge, weight in edges_dictionary.items()]),
+    'entropies': (['source', 'target', 'entropy'],
+      [edge.split('|') + [entropy]
+        for edge, entropy in entropies_dictionary.items()]),
+  }
+  for table_name, (header, rows) in tables.items():
+    file_name = os.path.join(name, f'{table_name}.csv')
+    try:
+      write_table(os.path.join(output_folder, file_name), header, rows)
+      report['files'][table_name] = file_name
+    except OSError as e:
+      report['errors'][table_name] = str(e)
+
+  # Figures, timed one by one
+  for figure_name, figsize, draw in report_figures:
+    start = time.perf_counter()
+    file_name = os.path.join(name, f'{figure_name}.png')
+    try:
+      fig = Figure(figsize=figsize)
+      draw(fig, nodes_dictionary, edges_dictionary, entropies_dictionary)
+      fig.savefig(os.path.join(output_folder, file_name), dpi=dpi)
+      report['files'][figure_name] = file_name
+    except Exception as e:
+      # For example, too few edges for the entropy surface
+      report['errors'][figure_name] = str(e)
+    report['render_times'][figure_name] = time.perf_counter() - start
+
+  return report
+
+################################################################
+# Function to write the index of the report
+################################################################
+def write_index(output_folder, reports):
+  rows = []
+  for report in reports:
+    cells = [html.escape(report['piece'])] + [
+      '-' if count is None else str(count)
+      for count in (report['node_count'], report['edge_count'])]
+    for name in ['network_graph', 'entropy_plot', 'nodes', 'edges',
+        'entropies']:
+      if name in report['files']:
+        link = html.escape(report['files'][name].replace(os.sep, '/'))
+        cells.append(f'<a href="{link}">{name}</a>')
+      else:
+        error = html.escape(report['errors'].get(name, ''))
+        cells.append(f'<span title="{error}">-</span>')
+    times = ', '.join(f'{name}: {seconds:.2f} s'
+      for name, seconds in report['render_times'].items())
+    if 'analysis' in report['errors']:
+      times += f" (error: {report['errors']['analysis']})"
+    cells.append(html.escape(times))
+    rows.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells)
+      + '</tr>')
+
+  header = ['Peça', 'Nodes', 'Arestes', 'Graf', 'Entropia', 'Taula de nodes',
+    'Taula d\'arestes', 'Taula d\'entropies', 'Temps']
+  with open(os.path.join(output_folder, 'index.html'), 'w',
+      encoding='utf-8') as index_file:
+    index_file.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+      '<title>Informe de la col·lecció</title></head><body>\n'
+      '<table border="1">\n<tr>'
+      + ''.join(f'<th>{html.escape(h)}</th>' for h in header)
+      + '</tr>\n' + '\n'.join(rows) + '\n</table>\n</body></html>\n')
+
+  write_table(os.path.join(output_folder, 'render_times.csv'),
+    ['piece', 'figure', 'seconds'],
+    [(report['piece'], name, f'{seconds:.4f}')
+      for report in reports
+      for name, seconds in report['render_times'].items()])
+
+################################################################
+# Function to render the report of every piece of a folder
+################################################################
+def render_corpus_report(folder, output_folder, workers=None, dpi=100):
+  os.makedirs(output_folder, exist_ok=True)
+  pieces = [(score_file_name, csv_file_name, output_folder, dpi)
+    for score_file_name, csv_file_name in find_corpus_pieces(folder)]
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    reports = list(executor.map(render_piece_report, pieces))
+
+  write_index(output_folder, reports)
+  return reports
+
+################################################################
+# Main program - Report of every piece in a folder
+################################################################
+if __name__ == '__main__':
+  folder = sys.argv[1] if len(sys.argv) > 1 else '.'
+  output_folder = sys.argv[2] if len(sys.argv) > 2 else 'report'
+  workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+  start = time.perf_counter()
+  reports = render_corpus_report(folder, output_folder, workers)
+  print(f"Piece count: {len(reports)}")
+  print(f"Total time: {time.perf_counter() - start:.2f} s")
+  for report in reports:
+    for figure_name, error in report['errors'].items():
+      print(f"Error in {report['piece']} ({figure_name}): {error}")
@@ -0,0 +1,187 @@
+import sys
+import time
+import wave
+import numpy as np
+from timebase import load_events
+from harmonics import note_values, harmonic_numbers, sounding_slices
+
+################################################################
+# Additive synthesis of a score
+#
+# Every note is the sum of its first partials (the same harmonic
+# model as get_harmonics), with amplitude 1/k for partial k. The
+# notes are split at every simultaneity of sounding_slices, so
+# that the partials a note shares with another voice at that
+# moment can be emphasised. Samples are rendered in blocks: every
+# block only evaluates the segments that overlap it, for all their
+# partials at once, and is written to the WAV file straight away.
+################################################################
+
+# Length of the attack and release of every note, in seconds
+attack_time = 0.01
+release_time = 0.05
+
+################################################################
+# Function to find which partials of every segment are shared
+# with another sounding voice
+################################################################
+def find_shared_partials(partials, grid_partials, other_voices,
+    chunk_size=4096):
+
+  # Segment x partial against segment x voice x partial, in chunks
+  # of segments so that memory stays bounded
+  shared = np.zeros(partials.shape, dtype=bool)
+  for start in range(0, len(partials), chunk_size):
+    stop = min(start + chunk_size, len(partials))
+    equal = partials[start:stop, :, None, None] \
+      == grid_partials[start:stop, None, :, :]
+    equal &= other_voices[start:stop, None, :, None]
+    shared[start:stop] = equal.any(axis=(2, 3))
+  return shared
+
+################################################################
+# Function to build the segments to synthesise
+################################################################
+def build_segments(events, tempo, sample_rate, partial_count, emphasis):
+  notes = np.flatnonzero(~events['rest'] & (events['duration'] > 0))
+  seconds_per_tick = 60.0 / (tempo * events['ticks_per_quarter'])
+  onsets = events['onset'][notes]
+  ends = onsets + events['duration'][notes]
+
+  # Every note is cut at the simultaneities it spans
+  times, voice_ids, note_grid, sounding = sounding_slices(events)
+  slice_ends = np.append(times[1:], max(ends.max(initial=0),
+    times[-1] + 1 if len(times) else 0))
+  first = np.searchsorted(times, onsets)
+  last = np.searchsorted(times, ends)
+  counts = last - first
+  note_of_segment = np.repeat(np.arange(len(notes)), counts)
+  slice_of_segment = np.repeat(first - np.cumsum(counts) + counts,
+    counts) + np.arange(counts.sum())
+
+  # Gain of every partial of every segment
+  gains = np.tile(1.0 / np.arange(1, partial_count + 1),
+    (len(note_of_segment), 1))
+  pitches = note_values(events)[notes]
+  fundamentals = 440.0 * 2.0 ** ((pitches - 49) / 12.0)
+  if emphasis and len(times):
+
+    # The partials of the note that match a partial of another
+    # voice sounding at that simultaneity
+    voice_columns = np.searchsorted(voice_ids,
+      events['voice'][notes][note_of_segment])
+    other_voices = sounding[slice_of_segment] \
+      & (np.arange(len(voice_ids)) != voice_columns[:, None])
+    shared = find_shared_partials(
+      harmonic_numbers(pitches[note_of_segment], partial_count),
+      harmonic_numbers(note_grid[slice_of_segment], partial_count),
+      other_voices)
+    gains = np.where(shared, gains * (1.0 + emphasis), gains)
+
+  # Partials above the Nyquist frequency are left out
+  frequencies = fundamentals[note_of_segment, None] \
+    * np.arange(1, partial_count + 1)
+  gains = np.where(frequencies < sample_rate / 2, gains, 0.0)
+
+  to_samples = seconds_per_tick * sample_rate
+  return {
+    'start': np.rint(np.maximum(times[slice_of_segment],
+      onsets[note_of_segment]) * to_samples).astype(np.int64),
+    'end': np.rint(np.minimum(slice_ends[slice_of_segment],
+      ends[note_of_segment]) * to_samples).astype(np.int64),
+    'note_start': onsets[note_of_segment] * seconds_per_tick,
+    'note_end': ends[note_of_segment] * seconds_per_tick,
+    'frequencies': frequencies,
+    'gains': gains,
+  }
+
+################################################################
+# Function to render the samples of the segments, block by block
+################################################################
+def render_blocks(segments, sample_rate, block_size=8192,
+    segment_chunk=64):
+  order = np.argsort(segments['start'], kind='stable')
+  segments = {name: values[order] for name, values in segments.items()}
+  starts, ends = segments['start'], segments['end']
+  if not len(starts):
+    return
+  max_length = int((ends - starts).max())
+
+  # Loudest possible moment (every gain at its peak), so that the
+  # whole file can be scaled before any block is written
+  changes = np.concatenate((starts, ends))
+  totals = segments['gains'].sum(axis=1)
+  steps = np.concatenate((totals, -totals))
+  order = np.lexsort((steps, changes))
+  peak = max(np.cumsum(steps[order]).max(), 1e-12)
+  scale = 0.9 / peak
+
+  for block_start in range(0, int(ends.max()), block_size):
+    block_end = min(block_start + block_size, int(ends.max()))
+    block = np.zeros(block_end - block_start)
+    samples = np.arange(block_start, block_end)
+    t = samples / sample_rate
+
+    # Segments that overlap the block
+    first = np.searchsorted(starts, block_start - max_length, side='right')
+    last = np.searchsorted(starts, block_end, side='left')
+    active = first + np.flatnonzero(ends[first:last] > block_start)
+
+    # All the partials of a chunk of segments at once
+    for chunk_start in range(0, len(active), segment_chunk):
+      chunk = active[chunk_start:chunk_start + segment_chunk]
+      inside = (samples >= starts[chunk, None]) \
+        & (samples < ends[chunk, None])
+      envelope = np.clip(np.minimum(
+        (t - segments['note_start'][chunk, None]) / attack_time,
+        (segments['note_end'][chunk, None] - t) / release_time), 0.0, 1.0)
+
+      # sin(k x) from sin(x) and cos(x), partial by partial:
+      # sin(k x) = 2 cos(x) sin((k - 1) x) - sin((k - 2) x)
+      phases = 2 * np.pi * segments['frequencies'][chunk, :1] * t
+      gains = segments['gains'][chunk]
+      sine, previous = np.sin(phases), np.zeros_like(phases)
+      twice_cosine = 2 * np.cos(phases)
+      waves = gains[:, :1] * sine
+      for k in range(1, gains.shape[1]):
+        sine, previous = twice_cosine * sine - previous, sine
+        waves += gains[:, k:k + 1] * sine
+      block += (waves * envelope * inside).sum(axis=0)
+
+    yield block * scale
+
+################################################################
+# Function to synthesise a note-event table to a WAV file
+################################################################
+def write_wav(wav_file_name, events, tempo=80, sample_rate=44100,
+    partial_count=10, emphasis=0.0, block_size=8192):
+  segments = build_segments(events, tempo, sample_rate, partial_count,
+    emphasis)
+
+  sample_count = 0
+  with wave.open(wav_file_name, 'wb') as wav_file:
+    wav_file.setnchannels(1)
+    wav_file.setsampwidth(2)
+    wav_file.setframerate(sample_rate)
+    for block in render_blocks(segments, sample_rate, block_size):
+      wav_file.writeframes(np.rint(block * 32767).astype('<i2').tobytes())
+      sample_count += len(block)
+
+  # Length of the audio, in seconds
+  return sample_count / sample_rate
+
+################################################################
+# Main program - Synthesise a score
+################################################################
+if __name__ == '__main__':
+  score_file_name, wav_file_name = sys.argv[1], sys.argv[2]
+  tempo = float(sys.argv[3]) if len(sys.argv) > 3 else 80
+  emphasis = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+
+  start = time.perf_counter()
+  events = load_events(score_file_name)
+  duration = write_wav(wav_file_name, events, tempo, emphasis=emphasis)
+  render_time = time.perf_counter() - start
+  print(f"Audio length: {duration:.1f} s")
+  print(f"Render time: {render_time:.2f} s "
+    f"({duration / max(render_time, 1e-9):.0f}x real time)")
@@ -0,0 +1,62 @@
+import os
+import sys
+import types
+import unittest
+
+# blender_scene importa bpy, que només existeix dins de Blender: n'hi ha prou amb
+# un mòdul buit per provar les funcions que no toquen l'escena
+sys.modules.setdefault('bpy', types.ModuleType('bpy'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blender_scene import diff_points, quarter_fraction
+
+
+class DiffPointsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.existing = {
+            'M1_V1_Q0/1': ((0.0, 0.0, 1.0), 1),
+            'M1_V1_Q1/1': ((1.0, 0.0, 2.0), 1),
+            'M1_V2_Q0/1': ((0.0, 1.0, 3.0), 2),
+        }
+
+    def test_unchanged(self):
+        self.assertEqual(diff_points(self.existing, dict(self.existing)), ([], [], []))
+
+    def test_add(self):
+        desired = dict(self.existing)
+        desired['M2_V1_Q0/1'] = ((2.0, 0.0, 1.0), 1)
+        self.assertEqual(diff_points(self.existing, desired), (['M2_V1_Q0/1'], [], []))
+
+    def test_move(self):
+        desired = dict(self.existing)
+        desired['M1_V1_Q1/1'] = ((1.0, 0.0, 2.5), 1)
+        self.assertEqual(diff_points(self.existing, desired), ([], ['M1_V1_Q1/1'], []))
+
+    def test_change_voice(self):
+        desired = dict(self.existing)
+        desired['M1_V2_Q0/1'] = ((0.0, 1.0, 3.0), 3)
+        self.assertEqual(diff_points(self.existing, desired), ([], ['M1_V2_Q0/1'], []))
+
+    def test_float32_precision_is_not_a_move(self):
+        desired = dict(self.existing)
+        desired['M1_V1_Q1/1'] = ((1.0 + 1e-6, 0.0, 2.0), 1)
+        self.assertEqual(diff_points(self.existing, desired), ([], [], []))
+
+    def test_remove(self):
+        desired = dict(self.existing)
+        del desired['M1_V2_Q0/1']
+        self.assertEqual(diff_points(self.existing, desired), ([], [], ['M1_V2_Q0/1']))
+
+
+class QuarterFractionTest(unittest.TestCase):
+
+    def test_independent_of_resolution(self):
+        # Una corxera amb punt després de l'inici del compàs, a 4 i a 12 ticks per negra
+        self.assertEqual(quarter_fraction(6, 4), '3/2')
+        self.assertEqual(quarter_fraction(18, 12), '3/2')
+        self.assertEqual(quarter_fraction(0, 12), '0/1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import math
+import xml.etree.ElementTree as ET
+import numpy as np
+
+################################################################
+# Shared integer timebase for MusicXML scores
+#
+# Every <divisions> value in the score is converted to one common
+# tick resolution (the LCM of all of them), so that onsets and
+# durations are exact integers whatever the meter, the tuplets or
+# the divisions changes between measures. The notes are returned
+# as a table of NumPy arrays (one entry per <note>), which the
+# analysis and the Blender scripts share.
+################################################################
+
+# Columns of the note-event table, in the order they are filled
+EVENT_COLUMNS = ('part', 'measure', 'measure_number', 'measure_start',
+  'voice', 'onset', 'duration', 'step', 'octave', 'alter', 'rest', 'color')
+
+################################################################
+# Function to find the common tick resolution of a score
+################################################################
+def find_ticks_per_quarter(root):
+
+  # Eighth notes must always be a whole number of ticks, since the
+  # tonal functions are indexed by eighth-note position
+  values = [2]
+  for divisions in root.iter('divisions'):
+    values.append(int(divisions.text))
+
+  # Measures in x/8, x/16... must also last a whole number of ticks
+  for beat_type in root.iter('beat-type'):
+    values.append(max(1, int(beat_type.text) // 4))
+
+  return math.lcm(*values)
+
+################################################################
+# Function to read the color of a note (note or notehead)
+################################################################
+def find_note_color(note):
+  color_hex = note.get('color')
+  if color_hex is None:
+    notehead = note.find('notehead')
+    if notehead is not None:
+      color_hex = notehead.get('color')
+  return color_hex.upper() if color_hex else ''
+
+################################################################
+# Function to load the note-event table from a MusicXML file
+################################################################
+def load_note_events(xml_file_name):
+
+  # Load and parse the MusicXML file
+  tree = ET.parse(xml_file_name)
+  root = tree.getroot()
+
+  ticks_per_quarter = find_ticks_per_quarter(root)
+  rows = {column: [] for column in EVENT_COLUMNS}
+  end_tick = 0
+
+  # Voices of later parts are numbered after those of the earlier
+  # parts, so that voice numbers are unique in the whole score
+  voice_offset = 0
+
+  for part_no, part in enumerate(root.findall('part')):
+    voice_map = {}
+    scale = ticks_per_quarter
+    beats, beat_type = 4, 4
+
+    # Start of the current measure, in ticks
+    measure_start = 0
+
+    for measure_no, measure in enumerate(part.findall('measure')):
+
+      # Position inside the measure, moved by <note>, <backup>
+      # and <forward>
+      cursor = 0
+      last_onset = 0
+
+      # Furthest position reached, which is the actual length of the
+      # measure (a pickup measure is shorter than a full bar)
+      measure_length = 0
+
+      for element in measure:
+        if element.tag == 'attributes':
+          divisions = element.find('divisions')
+          if divisions is not None:
+            scale = ticks_per_quarter // int(divisions.text)
+          time = element.find('time')
+          if time is not None:
+            beats_elem = time.find('beats')
+            beat_type_elem = time.find('beat-type')
+            if beats_elem is not None and beat_type_elem is not None:
+              # Compound signatures like "3+2" are added up
+              beats = sum(int(b) for b in beats_elem.text.split('+'))
+              beat_type = int(beat_type_elem.text)
+
+        elif element.tag in ('backup', 'forward'):
+          duration = element.find('duration')
+          if duration is not None:
+            ticks = round(float(duration.text) * scale)
+            cursor += ticks if element.tag == 'forward' else -ticks
+            measure_length = max(measure_length, cursor)
+
+        elif element.tag == 'note':
+
+          # Grace notes do not take any time, skip them
+          duration = element.find('duration')
+          if element.find('grace') is not None or duration is None:
+            continue
+          ticks = round(float(duration.text) * scale)
+
+          # Chord notes start with the previous note and do not
+          # move the cursor
+          if element.find('chord') is not None:
+            onset = last_onset
+          else:
+            onset = cursor
+            cursor += ticks
+            measure_length = max(measure_length, cursor)
+          last_onset = onset
+
+          voice = element.find('voice')
+          voice = voice.text if voice is not None else '1'
+          if voice not in voice_map:
+            voice_map[voice] = voice_offset + len(voice_map) + 1
+
+          step, octave, alter = '', 0, 0
+          pitch = element.find('pitch')
+          if pitch is not None:
+            step = pitch.find('step').text
+            octave = int(pitch.find('octave').text)
+            alter_elem = pitch.find('alter')
+            if alter_elem is not None:
+              alter = round(float(alter_elem.text))
+
+          rows['part'].append(part_no)
+          rows['measure'].append(measure_no)
+          rows['measure_number'].append(measure.get('number', ''))
+          rows['measure_start'].append(measure_start)
+          rows['voice'].append(voice_map[voice])
+          rows['onset'].append(measure_start + onset)
+          rows['duration'].append(ticks)
+          rows['step'].append(step)
+          rows['octave'].append(octave)
+          rows['alter'].append(alter)
+          rows['rest'].append(pitch is None)
+          rows['color'].append(find_note_color(element))
+
+      # Move to the next measure by its actual length, or by the time
+      # signature if the measure is empty
+      if measure_length == 0:
+        measure_length = beats * 4 * ticks_per_quarter // beat_type
+      measure_start += measure_length
+
+    end_tick = max(end_tick, measure_start)
+    voice_offset += len(voice_map)
+
+  return build_events(rows, ticks_per_quarter, end_tick)
+
+################################################################
+# Function to turn the collected rows into the event table
+################################################################
+def build_events(rows, ticks_per_quarter, end_tick):
+  events = {
+    'part': np.array(rows['part'], dtype=np.int64),
+    'measure': np.array(rows['measure'], dtype=np.int64),
+    'measure_number': np.array(rows['measure_number'], dtype=object),
+    'measure_start': np.array(rows['measure_start'], dtype=np.int64),
+    'voice': np.array(rows['voice'], dtype=np.int64),
+    'onset': np.array(rows['onset'], dtype=np.int64),
+    'duration': np.array(rows['duration'], dtype=np.int64),
+    'step': np.array(rows['step'], dtype=object),
+    'octave': np.array(rows['octave'], dtype=np.int64),
+    'alter': np.array(rows['alter'], dtype=np.int64),
+    'rest': np.array(rows['rest'], dtype=bool),
+    'color': np.array(rows['color'], dtype=object),
+    'ticks_per_quarter': ticks_per_quarter,
+    'end_tick': end_tick,
+  }
+  return events
+
+################################################################
+# Function to find the eighth-note position of every event
+################################################################
+def eighth_positions(events):
+
+  # A note belongs to the first eighth that starts at or after its
+  # onset, as the tonal functions .csv has always been read
+  ticks_per_eighth = events['ticks_per_quarter'] // 2
+  return -(-events['onset'] // ticks_per_eighth)
+
+################################################################
+# Function to load the note-event table of a MusicXML or MIDI file
+################################################################
+def load_events(file_name):
+  if file_name.lower().endswith(('.mid', '.midi')):
+    from midi_reader import load_midi_events
+    return load_midi_events(file_name)
+  return load_note_events(file_name)
@@ -0,0 +1,426 @@
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from timebase import load_note_events, eighth_positions
+
+################################################################
+# Tonal-function graph of a score
+#
+# The nodes are combinations of a note and a tonal function, in
+# the form "note-tonal_function", counted by appearances. The
+# edges link two nodes in the form "node1|node2" and accumulate
+# the weights of calculate_edge_weight. Edges only ever link a
+# measure with itself and with the measure before it, so a long
+# score can also be split into measure ranges and processed in a
+# process pool (load_edges_dictionary_sharded).
+################################################################
+
+# Edges lighter than this are pruned after every measure
+min_edge_weight = 5
+
+################################################################
+# Function to load the tonal functions from a CSV file
+################################################################
+def load_tonal_functions(csv_file_name):
+
+  # The key is the position (in eighth notes) and the value is the
+  # tonal function
+  tonal_functions = {}
+  with open(csv_file_name, mode='r') as csv_file:
+    csv_reader = csv.reader(csv_file)
+    for row in csv_reader:
+      position = row[1]
+      function = row[2]
+      tonal_functions[position] = function
+  return tonal_functions
+
+################################################################
+# Function to find the (score, .csv) pairs of a folder
+################################################################
+def find_corpus_pieces(folder):
+  pieces = []
+  score_file_names = glob.glob(os.path.join(folder, '*.musicxml')) \
+    + glob.glob(os.path.join(folder, '*.mid'))
+  for score_file_name in sorted(score_file_names):
+    csv_file_name = os.path.splitext(score_file_name)[0] + '.csv'
+    if os.path.exists(csv_file_name):
+      pieces.append((score_file_name, csv_file_name))
+  return pieces
+
+################################################################
+# Function to build the "note-tonal_function" key of every event
+################################################################
+def find_node_keys(events, tonal_functions):
+
+  # Position of every note in eighth notes, on the exact timebase
+  positions = eighth_positions(events)
+
+  # Keep only the notes (not the rests) that have a tonal function
+  keys = np.empty(len(positions), dtype=object)
+  for i, position in enumerate(positions):
+    tonal_function = tonal_functions.get(str(position))
+    if not events['rest'][i] and tonal_function is not None:
+      keys[i] = f"{events['step'][i]}-{tonal_function}"
+
+  return positions, keys
+
+################################################################
+# Function to load the nodes dictionary from a note-event table
+################################################################
+def load_nodes_dictionary(events, tonal_functions):
+  nodes_dictionary = {}
+  positions, keys = find_node_keys(events, tonal_functions)
+  for key in keys:
+    if key is not None:
+      nodes_dictionary[key] = nodes_dictionary.get(key, 0) + 1
+  return nodes_dictionary
+
+################################################################
+# Function to calculate an edge weight between two notes
+################################################################
+def calculate_edge_weight(position1, position2, voice1, voice2):
+  distance = position1 - position2
+  if distance <= 5 and position2 <= position1:
+    if voice1 == voice2:
+      if distance == 1:
+        return 8
+      elif distance == 2:
+        return 5
+      elif distance == 3:
+        return 3
+      elif distance == 4:
+        return 2
+      elif distance == 5:
+        return 1
+      else:
+        return 0
+    else:
+      if position1 == position2:
+        return 10
+      elif distance == 1:
+        return 7
+      elif distance == 2:
+        return 4
+      elif distance == 3:
+        return 2
+      elif distance == 4:
+        return 1
+      else:
+        return 0
+  return 0
+
+# Edge weights by distance in eighth notes, for notes in the same
+# voice and in different voices, as arrays to index all at once
+same_voice_weights = np.array(
+  [calculate_edge_weight(d, 0, 1, 1) for d in range(6)])
+other_voice_weights = np.array(
+  [calculate_edge_weight(d, 0, 1, 2) for d in range(6)])
+
+################################################################
+# Function to group the notes with a node key by measure
+################################################################
+def group_notes_by_measure(events, keys):
+
+  # Measures are shared by all the parts (their onsets line up on
+  # the timebase), so a score with one part per voice also gets
+  # edges between its voices
+  measures = events['measure']
+
+  # Notes of every measure, in score order, and where each measure
+  # starts and ends in that order. Measures without any event are
+  # skipped, exactly as the serial loop does.
+  order = np.argsort(measures, kind='stable')
+  _, starts = np.unique(measures[order], return_index=True)
+  bounds = np.append(starts, len(order))
+  valid = keys.astype(bool)
+  groups = [order[start:end][valid[order[start:end]]]
+    for start, end in zip(bounds[:-1], bounds[1:])]
+  return groups
+
+################################################################
+# Function to find the edges between two sets of notes
+################################################################
+def find_measure_edges(positions, keys, voices, notes1, notes2):
+
+  # Distance in eighth notes between every pair of notes
+  distance = positions[notes1][:, None] - positions[notes2][None, :]
+  in_range = (distance >= 0) & (distance <= 5)
+  distance = np.where(in_range, distance, 0)
+  same_voice = voices[notes1][:, None] == voices[notes2][None, :]
+  weights = np.where(same_voice, same_voice_weights[distance],
+    other_voice_weights[distance])
+  weights = np.where(in_range, weights, 0)
+
+  # Only consider non-zero edge weights, in score order
+  for i, j in zip(*np.nonzero(weights)):
+    yield f"{keys[notes1[i]]}|{keys[notes2[j]]}", int(weights[i, j])
+
+################################################################
+# Function to load the edges dictionary from a note-event table
+################################################################
+def load_edges_dictionary(events, tonal_functions):
+  edges_dictionary = {}
+  positions, keys = find_node_keys(events, tonal_functions)
+  voices = events['voice']
+
+  # Notes of the last measure processed
+  last_notes = np.empty(0, dtype=np.int64)
+
+  # Iterate through each measure, linking its notes with the
+  # notes of the same measure and of the measure before it
+  for notes1 in group_notes_by_measure(events, keys):
+    notes2 = np.concatenate((last_notes, notes1))
+    for key, weight in find_measure_edges(
+        positions, keys, voices, notes1, notes2):
+      edges_dictionary[key] = edges_dictionary.get(key, 0) + weight
+
+    for edge in list(edges_dictionary.keys()):
+      if edges_dictionary[edge] < min_edge_weight:
+        del edges_dictionary[edge]
+    last_notes = notes1
+
+  return edges_dictionary
+
+################################################################
+# Function to process one range of measures (in a worker)
+################################################################
+def load_edges_shard(shard):
+
+  # The shard holds the notes of its measures and, if it is not the
+  # first shard, of the measure before them (the overlap)
+  positions, keys, voices, bounds, first_measure, overlap = shard
+  groups = [np.arange(start, end)
+    for start, end in zip(bounds[:-1], bounds[1:])]
+  last_notes = groups.pop(0) if overlap else np.empty(0, np.int64)
+
+  # For every edge: the weight it would have at the end of the
+  # shard if it started the shard pruned, the total weight added
+  # in the shard, and when it was (re)inserted in the dictionary
+  shard_edges = {}
+
+  for measure_no, notes1 in enumerate(groups, first_measure):
+    notes2 = np.concatenate((last_notes, notes1))
+    measure_edges = {}
+    for key, weight in find_measure_edges(
+        positions, keys, voices, notes1, notes2):
+      measure_edges[key] = measure_edges.get(key, 0) + weight
+
+    # Pruning only happens at the end of each measure, so the
+    # weights of the measure are added up before checking them
+    for rank, (key, weight) in enumerate(measure_edges.items()):
+      edge = shard_edges.setdefault(key, [0, 0, None])
+      if edge[0] == 0:
+        edge[2] = (measure_no, rank)
+      edge[0] += weight
+      edge[1] += weight
+      if edge[0] < min_edge_weight:
+        edge[0] = 0
+    last_notes = notes1
+
+  return shard_edges
+
+################################################################
+# Function to merge the shards, in measure order
+################################################################
+def merge_edges_shards(shards_edges):
+  merged = {}
+  for shard_edges in shards_edges:
+    for key, (weight, total, inserted) in shard_edges.items():
+      edge = merged.get(key)
+
+      # Weights never decrease, so an edge that survived the
+      # pruning before the shard just gets all of its new weight.
+      # Otherwise it starts the shard pruned.
+      if edge is not None and edge[0] >= min_edge_weight:
+        edge[0] += total
+      else:
+        merged[key] = [weight, inserted]
+
+  # Same keys, weights and insertion order as the serial version
+  edges = sorted(((inserted, key, weight)
+    for key, (weight, inserted) in merged.items() if weight > 0))
+  return {key: weight for inserted, key, weight in edges}
+
+################################################################
+# Function to load the edges dictionary with a process pool
+################################################################
+def load_edges_dictionary_sharded(events, tonal_functions,
+    workers=None, shards_per_worker=4):
+  positions, keys = find_node_keys(events, tonal_functions)
+  voices = events['voice']
+  groups = group_notes_by_measure(events, keys)
+
+  # A few shards per worker, so that the slow ones balance out
+  workers = workers or os.cpu_count() or 1
+  shard_count = max(1, min(len(groups), workers * shards_per_worker))
+  limits = np.linspace(0, len(groups), shard_count + 1).astype(int)
+
+  # Every shard gets its measures plus one measure of overlap
+  shards = []
+  for first, last in zip(limits[:-1], limits[1:]):
+    overlap = first > 0
+    shard_groups = groups[first - overlap:last]
+    notes = np.concatenate(shard_groups + [np.empty(0, np.int64)])
+    bounds = np.cumsum([0] + [len(g) for g in shard_groups])
+    shards.append((positions[notes], keys[notes], voices[notes],
+      bounds, first, overlap))
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    shards_edges = list(executor.map(load_edges_shard, shards))
+
+  return merge_edges_shards(shards_edges)
+
+################################################################
+# Function to calculate the entropy
+################################################################
+def calculate_entropies(nodes_dictionary, edges_dictionary,
+    verbose=False):
+  edges_value = 1.0
+  nodes_value = 0.1
+  entropies = {}
+  min_entropy = 5
+
+  for node in nodes_dictionary:
+    sum_edges = 0
+    sum_nodes = 0
+    for edge in edges_dictionary:
+      first_node, second_node = edge.split('|')
+      if node == first_node:
+        sum_edges += edges_dictionary[edge]
+        sum_nodes += nodes_dictionary[second_node]
+      
+    for edge in edges_dictionary:
+      first_node, second_node = edge.split('|')
+      if node == first_node:
+        if verbose:
+          print(edges_dictionary[edge], sum_edges,
+             nodes_dictionary[second_node], sum_nodes)
+
+
+        S_aresta = (
+          edges_dictionary[edge] / sum_edges) * edges_value + (
+          nodes_dictionary[second_node] / sum_nodes) * nodes_value
+        entropia_aresta = round(S_aresta * 100, 2)
+        
+        # Filter entropies less or equal to 5
+        if entropia_aresta > min_entropy:
+          entropies[edge] = entropia_aresta
+  
+  return entropies
+
+################################################################
+# Function to load the graph as arrays, edges grouped by source
+################################################################
+def load_graph_arrays(nodes_dictionary, edges_dictionary):
+
+  # Nodes in dictionary order, and every edge as two node indices
+  nodes = list(nodes_dictionary)
+  node_index = {node: i for i, node in enumerate(nodes)}
+  edges = list(edges_dictionary)
+  pairs = [edge.split('|') for edge in edges]
+  source = np.array([node_index[first] for first, _ in pairs],
+    dtype=np.int64).reshape(-1)
+  target = np.array([node_index[second] for _, second in pairs],
+    dtype=np.int64).reshape(-1)
+  weights = np.array([edges_dictionary[edge] for edge in edges],
+    dtype=np.float64).reshape(-1)
+  node_counts = np.array([nodes_dictionary[node] for node in nodes],
+    dtype=np.float64).reshape(-1)
+
+  # Edges sorted by source node (as calculate_entropies visits
+  # them), with the start of every node's edges in indptr
+  order = np.argsort(source, kind='stable')
+  source, target, weights = source[order], target[order], weights[order]
+  indptr = np.searchsorted(source, np.arange(len(nodes) + 1))
+
+  # Sums of the outgoing edge weights and of the target node counts
+  # of every node, computed once for all the sweeps
+  edge_sums = np.bincount(source, weights=weights, minlength=len(nodes))
+  node_sums = np.bincount(source, weights=node_counts[target],
+    minlength=len(nodes))
+
+  # Edge keys are "later|earlier" (see find_measure_edges), so the
+  # notes that follow a node are the sources of the edges that end
+  # in it: sums of those weights, for the information metrics
+  successor_sums = np.bincount(target, weights=weights,
+    minlength=len(nodes))
+
+  return {
+    'nodes': nodes,
+    'edges': [edges[i] for i in order],
+    'source': source,
+    'target': target,
+    'weights': weights,
+    'node_counts': node_counts,
+    'indptr': indptr,
+    'edge_sums': edge_sums,
+    'node_sums': node_sums,
+    'edge_shares': weights / edge_sums[source],
+    'node_shares': node_counts[target] / node_sums[source],
+    'successor_sums': successor_sums,
+    'successor_shares': weights / successor_sums[target],
+  }
+
+################################################################
+# Function to calculate the entropies for a grid of parameters
+################################################################
+def entropy_sweep(graph_arrays, edges_values, nodes_values,
+    min_entropies):
+  edges_values = np.asarray(edges_values, dtype=np.float64).reshape(-1)
+  nodes_values = np.asarray(nodes_values, dtype=np.float64).reshape(-1)
+  min_entropies = np.asarray(min_entropies, dtype=np.float64).reshape(-1)
+
+  # Same formula as calculate_entropies, for every edge and every
+  # (edges_value, nodes_value) pair at once: edge x edges_value x
+  # nodes_value
+  edge_shares = graph_arrays['edge_shares'][:, None, None]
+  node_shares = graph_arrays['node_shares'][:, None, None]
+  scores = np.round((edge_shares * edges_values[None, :, None]
+    + node_shares * nodes_values[None, None, :]) * 100, 2)
+
+  # Every threshold is applied to the same scores. A graph without
+  # edges (all of them pruned) gives 0 edges for every parameter set.
+  surviving = scores[..., None] > min_entropies
+  edge_counts = surviving.sum(axis=0)
+
+  # Tidy table: one row per parameter set, with the score of every
+  # edge (NaN where it is filtered out) and the surviving edge count
+  grid = np.meshgrid(edges_values, nodes_values, min_entropies,
+    indexing='ij')
+  entropies = np.where(surviving, scores[..., None], np.nan)
+  return {
+    'edges': graph_arrays['edges'],
+    'edges_value': grid[0].ravel(),
+    'nodes_value': grid[1].ravel(),
+    'min_entropy': grid[2].ravel(),
+    'edge_count': edge_counts.ravel(),
+    'entropies': entropies.reshape(len(graph_arrays['edges']),
+      edge_counts.size).T,
+  }
+
+################################################################
+# Main program - Compare the serial and the sharded versions
+################################################################
+if __name__ == '__main__':
+  xml_file_name, csv_file_name = sys.argv[1], sys.argv[2]
+  workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+  events = load_note_events(xml_file_name)
+  tonal_functions = load_tonal_functions(csv_file_name)
+
+  start = time.perf_counter()
+  serial = load_edges_dictionary(events, tonal_functions)
+  serial_time = time.perf_counter() - start
+
+  start = time.perf_counter()
+  sharded = load_edges_dictionary_sharded(events, tonal_functions,
+    workers)
+  sharded_time = time.perf_counter() - start
+
+  print(f"Edge count: {len(serial)}")
+  print(f"Serial: {serial_time:.2f} s, sharded: {sharded_time:.2f} s")
+  print(f"Same result: {list(serial.items()) == list(sharded.items())}")